@@ -0,0 +1,81 @@
+"""Measure the memory and allocation churn of the interpolation model.
+
+On a synthetic document pair (see synthetic.py) this reports the peak
+traced memory of compiling the plan and what the plan keeps, then mixes
+frames and reports the peak traced memory per frame, the garbage
+collections they triggered and the time those paused for, and the size
+of the value objects the model allocates. Rasterization is left out.
+
+    python benchmarks/memory.py --size 1000 --frames 20 --json memory.json
+"""
+from argparse import ArgumentParser
+from io import BytesIO
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import svglayer
+from synthetic import Counts, pair
+
+class Collections:
+    """Count and time the collections of every generation of the gc."""
+    def __init__(self):
+        self.counts, self.pause, self.started = [0, 0, 0], 0, None
+
+    def __call__(self, phase: str, info: dict):
+        if phase == 'start':
+            self.started = time.perf_counter()
+        else:
+            self.counts[info['generation']] += 1
+            self.pause += time.perf_counter() - self.started
+
+def sizes() -> dict:
+    """Bytes taken by one instance of each value type, without its fields."""
+    values = [svglayer.Color(1, 2, 3), svglayer.Point(1, 2), svglayer.Dimension(1, 'px'),
+              svglayer.Link('a'), svglayer.Function('rotate', (1,)),
+              svglayer.Stop(0, svglayer.Color(1, 2, 3)), svglayer.Transforms(),
+              svglayer.Stroke(None, 1), svglayer.SorryWhat('a')]
+    return {type(value).__name__: sys.getsizeof(value) + (
+        sys.getsizeof(value.__dict__) if hasattr(value, '__dict__') else 0) for value in values}
+
+def measure(source: bytes, target: bytes, frames: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    animation = svglayer.Animation(BytesIO(source), BytesIO(target))
+    compiled, compile_peak = tracemalloc.get_traced_memory()
+    collections = Collections()
+    gc.callbacks.append(collections)
+    peaks, start = [], time.perf_counter()
+    try:
+        for tree in animation.frames([i/(frames-1) for i in range(frames)]):
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            del tree
+    finally:
+        gc.callbacks.remove(collections)
+        tracemalloc.stop()
+    return {'compile_peak': compile_peak, 'compiled': compiled,
+            'frame_peak': max(peaks) - compiled, 'mix': (time.perf_counter() - start) / frames,
+            'collections': [count / frames for count in collections.counts],
+            'gc_pause': collections.pause / frames, 'channels': len(animation.channels)}
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='see synthetic.Counts.preset')
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--segments', type=int, default=100, help='segments per path')
+    parser.add_argument('--json', metavar='FILE', help='save the results to FILE')
+    args = parser.parse_args()
+    counts = Counts.preset(args.size)
+    counts.segments = args.segments
+    result = measure(*pair(counts), args.frames)
+    result.update(size=args.size, frames=args.frames, counts=vars(counts), sizes=sizes())
+    text = json.dumps(result, indent=1)
+    if args.json:
+        with open(args.json, 'w') as file: file.write(text)
+    print(text)
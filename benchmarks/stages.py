@@ -0,0 +1,111 @@
+"""Time every stage of svglayer separately on synthetic document pairs.
+
+For each size (see synthetic.Counts.preset) and frame count, this times
+parsing, Node construction, objectify (including reading every channel),
+the whole compiled plan, mixing the frames, serializing them and
+rasterizing a few of them. Results are saved as JSON so that runs on two
+commits can be compared:
+
+    python benchmarks/stages.py --json before.json
+    git checkout other && python benchmarks/stages.py --json after.json --compare before.json
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from io import BytesIO
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import svglayer
+from synthetic import Counts, pair
+
+@contextmanager
+def timer(timings: dict, stage: str):
+    # every stage parses from scratch, whatever ran before it
+    svglayer.parse_value.cache_clear()
+    svglayer.parse_style.cache_clear()
+    start = time.perf_counter()
+    yield
+    timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+
+def measure(source: bytes, target: bytes, frames: int, rasters: int) -> dict:
+    timings = {}
+    with timer(timings, 'parse'):
+        one, two = ET.fromstring(source), ET.fromstring(target)
+    with timer(timings, 'node'):
+        first, last = svglayer.index(one), svglayer.index(two)
+    with timer(timings, 'objectify'):
+        for key in first.keys() & last.keys():
+            if key.startswith('!'): continue
+            for obj in (svglayer.objectify(first[key], first), svglayer.objectify(last[key], last)):
+                if obj is not None: [getattr(obj, name) for name in obj.channels]
+    with timer(timings, 'compile'):
+        animation = svglayer.Animation(BytesIO(source), BytesIO(target))
+    with timer(timings, 'mix'):
+        trees = list(animation.frames([i/(frames-1) for i in range(frames)]))
+    with timer(timings, 'serialize'):
+        data = [ET.tostring(tree.getroot()) for tree in trees]
+    # rasterization is by far the slowest stage: time a few frames and scale up
+    step = max(1, frames // rasters)
+    with timer(timings, 'raster'):
+        for buffer in data[::step]:
+            svglayer.pyvips.Image.new_from_buffer(buffer, '').copy_memory()
+    timings['raster'] *= frames / len(data[::step])
+    return {'timings': timings, 'channels': len(animation.channels),
+            'bytes': sum(map(len, data)) / frames, 'rasterized': len(data[::step])}
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, text=True,
+                              capture_output=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results: list, path: str):
+    with open(path) as file: before = json.load(file)
+    old = {(run['size'], run['frames']): run['timings'] for run in before['results']}
+    print(f'against {before["commit"]} (old/new, above 1 is faster now):')
+    for run in results:
+        if (timings := old.get((run['size'], run['frames']))) is None: continue
+        ratios = ' '.join(f'{stage} {timings[stage] / seconds:.2f}'
+                          for stage, seconds in run['timings'].items()
+                          if stage in timings and seconds)
+        print(f'  size {run["size"]} frames {run["frames"]}: {ratios}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--frames', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--rasters', type=int, default=3,
+                        help='frames actually rasterized per run')
+    parser.add_argument('--segments', type=int, default=100, help='segments per path')
+    parser.add_argument('--repeat', type=int, default=1, help='keep the fastest of N runs')
+    parser.add_argument('--json', metavar='FILE', help='save the results to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='print speedups against FILE')
+    args = parser.parse_args()
+    results = []
+    for size in args.sizes:
+        counts = Counts.preset(size)
+        counts.segments = args.segments
+        source, target = pair(counts)
+        for frames in args.frames:
+            runs = [measure(source, target, frames, args.rasters) for _ in range(args.repeat)]
+            run = min(runs, key=lambda run: sum(run['timings'].values()))
+            run.update(size=size, frames=frames, counts=vars(counts),
+                       elements=counts.elements())
+            results.append(run)
+            print(f'size {size} frames {frames}: ' + ' '.join(
+                f'{stage} {seconds:.3f}s' for stage, seconds in run['timings'].items()),
+                file=sys.stderr)
+    report = {'commit': commit(), 'python': platform.python_version(),
+              'vips': '.'.join(str(svglayer.pyvips.version(k)) for k in range(3)),
+              'results': results}
+    if args.json:
+        with open(args.json, 'w') as file: json.dump(report, file, indent=1)
+    if args.compare: compare(results, args.compare)
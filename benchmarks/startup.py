@@ -0,0 +1,44 @@
+"""Time how long a fresh interpreter takes to import svglayer.
+
+Short-lived batch jobs only need the interpolation model, so this also
+reports which heavy dependencies the import pulled in: numpy, which the
+model needs, and the optional ones that should stay lazy.
+Run from anywhere: python benchmarks/startup.py [--runs N]
+"""
+from argparse import ArgumentParser
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+heavy = ['numpy', 'pyvips', 'svg.path', 'concurrent.futures.process']
+child = f'''
+import sys, time
+start = time.perf_counter()
+import svglayer
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{'import': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+def run() -> dict:
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', child], cwd=root, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output)
+    result['process'] = time.perf_counter() - start
+    return result
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    run()  # write the bytecode cache
+    results = [run() for _ in range(args.runs)]
+    summary = {key: {'median': statistics.median(r[key] for r in results),
+                     'min': min(r[key] for r in results)} for key in ('import', 'process')}
+    summary['loaded'] = results[0]['loaded']
+    print(json.dumps(summary, indent=2))
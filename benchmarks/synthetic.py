@@ -0,0 +1,110 @@
+"""Generate pairs of SVG documents to morph, with tunable contents.
+
+Both documents of a pair have the same elements with the same ids, so
+every one of them is animated; only coordinates, colors, sizes, blur
+deviations and texts differ. Run directly to write a pair to disk:
+
+    python benchmarks/synthetic.py a.svg b.svg --rects 1000 --paths 10
+"""
+from argparse import ArgumentParser
+from dataclasses import dataclass, asdict
+from random import Random
+from typing import Tuple
+
+head = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'width="{size}" height="{size}" viewBox="0 0 {size} {size}" id="svg">')
+words = 'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor'.split()
+
+@dataclass
+class Counts:
+    rects: int = 0
+    ellipses: int = 0
+    texts: int = 0
+    gradients: int = 0
+    chain: int = 2  # gradients inheriting from each other through xlink:href
+    blurs: int = 0
+    paths: int = 0
+    segments: int = 100
+
+    @classmethod
+    def preset(cls, size: int) -> 'Counts':
+        """A mix of everything, with size rects and fewer of the rest."""
+        return cls(rects=size, ellipses=size//2, texts=size//4, gradients=max(1, size//10),
+                   blurs=max(1, size//10), paths=max(1, size//10))
+
+    def elements(self) -> int:
+        return self.rects + self.ellipses + self.texts + self.blurs + self.paths
+
+def document(counts: Counts, seed: int, size: int = 1000) -> str:
+    rng = Random(seed)
+    number = lambda low=0, high=size: f'{rng.uniform(low, high):.3f}'
+    color = lambda: f'#{rng.randrange(1 << 24):06x}'
+    painted = 0
+
+    def fill() -> str:
+        # every third element is painted with the tip of a gradient chain
+        nonlocal painted
+        painted += 1
+        if counts.gradients and painted % 3 == 0:
+            return f'url(#g{painted//3 % counts.gradients}-{counts.chain})'
+        return color()
+
+    defs, body = [], []
+    for j in range(counts.gradients):
+        defs.append(f'<linearGradient id="g{j}-0">'
+                    f'<stop offset="0" style="stop-color:{color()};stop-opacity:1" id="s{j}a"/>'
+                    f'<stop offset="{number(0, 1)}" style="stop-color:{color()};stop-opacity:'
+                    f'{number(0, 1)}" id="s{j}b"/></linearGradient>')
+        for k in range(1, counts.chain + 1):
+            if k % 2:
+                defs.append(f'<radialGradient id="g{j}-{k}" xlink:href="#g{j}-{k-1}" '
+                            f'gradientUnits="userSpaceOnUse" cx="{number()}" cy="{number()}" '
+                            f'r="{number(10, size/4)}"/>')
+            else:
+                defs.append(f'<linearGradient id="g{j}-{k}" xlink:href="#g{j}-{k-1}" '
+                            f'gradientUnits="userSpaceOnUse" x1="{number()}" y1="{number()}" '
+                            f'x2="{number()}" y2="{number()}"/>')
+    for i in range(counts.rects):
+        body.append(f'<rect id="r{i}" x="{number()}" y="{number()}" width="{number(1, 100)}" '
+                    f'height="{number(1, 100)}" transform="rotate({number(-45, 45)})" '
+                    f'style="fill:{fill()};fill-opacity:{number(0.5, 1)}"/>')
+    for i in range(counts.ellipses):
+        body.append(f'<ellipse id="e{i}" cx="{number()}" cy="{number()}" rx="{number(1, 60)}" '
+                    f'ry="{number(1, 60)}" style="fill:{fill()};stroke:{color()};'
+                    f'stroke-width:{number(0.5, 4)}"/>')
+    for i in range(counts.texts):
+        text = ' '.join(rng.choice(words) for _ in range(rng.randrange(1, 6)))
+        body.append(f'<text id="t{i}" x="{number()}" y="{number()}" '
+                    f'style="font-size:{number(8, 40)}px;font-family:sans-serif;fill:{fill()}">'
+                    f'{text}</text>')
+    for i in range(counts.blurs):
+        defs.append(f'<filter id="f{i}" x="-0.5" y="-0.5" width="2" height="2">'
+                    f'<feGaussianBlur stdDeviation="{number(0.5, 8)}" id="f{i}b"/></filter>')
+        body.append(f'<rect id="b{i}" x="{number()}" y="{number()}" width="{number(10, 100)}" '
+                    f'height="{number(10, 100)}" style="fill:{fill()};filter:url(#f{i})"/>')
+    for i in range(counts.paths):
+        data = [f'M {number()},{number()}']
+        for k in range(counts.segments):
+            points = ' '.join(f'{number()},{number()}' for _ in range(k % 3 + 1))
+            data.append('LQC'[k % 3] + ' ' + points)
+        body.append(f'<path id="p{i}" d="{" ".join(data)} Z" '
+                    f'style="fill:{fill()};stroke:{color()};stroke-width:{number(0.5, 4)}"/>')
+    return '\n'.join([head.format(size=size), '<defs id="defs">', *defs, '</defs>',
+                      '<g id="layer">', *body, '</g>', '</svg>'])
+
+def pair(counts: Counts, seed: int = 0, size: int = 1000) -> Tuple[bytes, bytes]:
+    return (document(counts, 2*seed, size).encode(),
+            document(counts, 2*seed + 1, size).encode())
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=1000, help='width and height in pixels')
+    for field, default in asdict(Counts()).items():
+        parser.add_argument(f'--{field}', type=int, default=default)
+    args = parser.parse_args()
+    counts = Counts(**{field: getattr(args, field) for field in asdict(Counts())})
+    for path, data in zip((args.source, args.target), pair(counts, args.seed, args.size)):
+        with open(path, 'wb') as file: file.write(data)
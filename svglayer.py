@@ -1,29 +1,140 @@
-from dataclasses import dataclass
-from typing import List, Dict, Union, Tuple, Optional
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import List, Dict, Union, Tuple, Optional, Iterator, Callable
 import xml.etree.ElementTree as ET
-from pprint import pprint
-from random import randint
-
+from copy import deepcopy
+from abc import ABC, abstractmethod
+from argparse import ArgumentParser, ArgumentTypeError
+from io import BytesIO
+from contextlib import contextmanager, nullcontext
+from math import atan, atan2, cos, sin, tan, hypot, degrees, radians, ceil, floor, sqrt, inf
+from difflib import SequenceMatcher
+from bisect import bisect
+from functools import lru_cache
+from graphlib import TopologicalSorter, CycleError
+import re
+import importlib
+import os
+import sys
+import shutil
+import tempfile
+import hashlib
+import json
+import socket
+import threading
+import time
+from queue import Queue
+
+import numpy as np
 import tinycss2
 from tinycss2 import parse_declaration_list, parse_component_value_list
 import tinycss2.color3
-import webcolors
-from svg.path import parse_path, Path
-import pyvips
+
+class Lazy:
+    """Module imported on first use, so that the model loads without the
+    dependencies of rasterization, path morphing and process pools."""
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attribute: str):
+        module = importlib.import_module(self.name)
+        self.__dict__.update(vars(module))
+        return getattr(module, attribute)
+
+pyvips = Lazy('pyvips')
+svgpath = Lazy('svg.path')
+futures = Lazy('concurrent.futures')
 
 def mix(a, b, v):
-    if type(a) == type(b) == Dimension: return a.mix(b, v)
+    if isinstance(a, str): return strmix(a, b, v)
+    if isinstance(a, tuple):
+        assert len(a) == len(b)
+        return tuple(mix(x, y, v) for x, y in zip(a, b))
+    if hasattr(a, 'mix'): return a.mix(b, v)
     return a*(1-v) + b*v
 
+def flat(value) -> List[float]:
+    if isinstance(value, (int, float)): return [value]
+    if isinstance(value, tuple): return [x for v in value for x in flat(v)]
+    if hasattr(value, 'flat'): return value.flat()
+    return []
+
+def unflat(value, values: Iterator[float]):
+    if isinstance(value, (int, float)): return next(values)
+    if isinstance(value, tuple): return tuple(unflat(v, values) for v in value)
+    if hasattr(value, 'unflat'): return value.unflat(values)
+    return value
+
 def strmix(a, b, v):
-    if len(a) < len(b):
-        a = a.ljust(len(b))
-    elif len(a) > len(b):
-        b = b.ljust(len(a))
-    diff = [i for i, (x, y) in enumerate(zip(a, b)) if x!=y]
-    diff = diff[:int(v*len(diff))]
-    a = ''.join(cb if i in diff else ca for i, (ca, cb) in enumerate(zip(a, b)))
-    return a
+    return EditScript(a, b)(v)
+
+def changes(a, b, i1=0, i2=None, j1=0, j2=None, limit=250_000) -> List[Tuple[int, int, int, int]]:
+    """Differing (i1, i2, j1, j2) runs of two sequences, in order.
+
+    Patience diff: runs are split on items that occur exactly once on both
+    sides. What has no such anchor goes through SequenceMatcher when it is
+    small enough, and is otherwise reported as one replaced run.
+    """
+    i2 = len(a) if i2 is None else i2
+    j2 = len(b) if j2 is None else j2
+    while i1 < i2 and j1 < j2 and a[i1] == b[j1]: i1, j1 = i1 + 1, j1 + 1
+    while i1 < i2 and j1 < j2 and a[i2-1] == b[j2-1]: i2, j2 = i2 - 1, j2 - 1
+    if i1 == i2 or j1 == j2:
+        return [(i1, i2, j1, j2)] if (i1, j1) != (i2, j2) else []
+    mine, theirs = {}, {}
+    for i in range(i1, i2): mine[a[i]] = i if a[i] not in mine else None
+    for j in range(j1, j2): theirs[b[j]] = j if b[j] not in theirs else None
+    pairs = sorted((i, theirs[item]) for item, i in mine.items()
+                   if i is not None and theirs.get(item) is not None)
+    # longest run of pairs increasing on both sides
+    tails, links = [], {}
+    for i, j in pairs:
+        k = bisect([tail[1] for tail in tails], j)
+        links[i, j] = tails[k-1] if k else None
+        tails[k:k+1] = [(i, j)]
+    anchors = []
+    anchor = tails[-1] if tails else None
+    while anchor is not None:
+        anchors.insert(0, anchor)
+        anchor = links[anchor]
+    if not anchors:
+        if (i2 - i1) * (j2 - j1) > limit: return [(i1, i2, j1, j2)]
+        matcher = SequenceMatcher(None, a[i1:i2], b[j1:j2], autojunk=False)
+        return [(i1 + k1, i1 + k2, j1 + l1, j1 + l2) for tag, k1, k2, l1, l2
+                in matcher.get_opcodes() if tag != 'equal']
+    runs = []
+    for i, j in anchors + [(i2, j2)]:
+        runs += changes(a, b, i1, i, j1, j, limit)
+        i1, j1 = i + 1, j + 1
+    return runs
+
+class EditScript:
+    """Single-character edits turning one string into another, left to right.
+
+    marks[k] holds the positions in both strings right after the k-th edit,
+    so the text with k edits applied is the new prefix plus the old suffix.
+    The strings are diffed word by word first and only the replaced runs
+    character by character, which keeps long texts fast to set up.
+    """
+
+    words = re.compile(r'\s+|\w+|[^\w\s]+')
+
+    def __init__(self, a: str, b: str):
+        self.a, self.b = a, b
+        self.marks = [(0, 0)]
+        one, two = self.words.findall(a), self.words.findall(b)
+        i = [0, *np.cumsum([len(word) for word in one], dtype=int).tolist()]
+        j = [0, *np.cumsum([len(word) for word in two], dtype=int).tolist()]
+        for i1, i2, j1, j2 in changes(one, two):
+            for k1, k2, l1, l2 in changes(a, b, i[i1], i[i2], j[j1], j[j2]):
+                for k in range(max(k2 - k1, l2 - l1)):
+                    self.marks.append((min(k1 + k + 1, k2), min(l1 + k + 1, l2)))
+
+    def __len__(self): return len(self.marks) - 1
+
+    def __call__(self, v) -> str:
+        i, j = self.marks[int(v*len(self))]
+        return self.b[:j] + self.a[i:]
 
 def objectify(node, nodes):
     objs = {'linearGradient': LinearGradient,
@@ -34,11 +145,73 @@ def objectify(node, nodes):
             'text': Text,
             'line': Line,
             'polyline': PolyLine,
+            'polygon': PolyLine,
             'path': Path}
     if not node.name in objs: return None
     return objs[node.name](node, nodes)
 
-@dataclass(frozen=True)
+def references(element: ET.Element) -> set:
+    targets = set()
+    for key, value in element.attrib.items():
+        targets.update(re.findall(r'url\(#([^)]+)\)', value))
+        if key.endswith('href') and value.startswith('#'):
+            targets.add(value[1:])
+    return targets
+
+def index(root):
+    nodes = {node.attrib['id']: Node(node) for node in root.iter() if 'id' in node.attrib}
+    if (defs := next(root.iter('{http://www.w3.org/2000/svg}defs'), None)) is None:
+        # where blur filters get allocated
+        defs = ET.Element('{http://www.w3.org/2000/svg}defs')
+        root.insert(0, defs)
+    nodes['!defs'] = Node(defs)
+    nodes['!resources'] = Resources(nodes)
+    return nodes
+
+class Resources:
+    """Reference graph of a document, from every id to the ids it uses.
+
+    Edges come from url(#...) values and xlink:href, so the static order of
+    the graph lists every gradient or filter before the elements using or
+    inheriting from it. Resolved gradient stops are cached per id.
+    """
+
+    def __init__(self, nodes: Dict[str, 'Node']):
+        self.nodes = nodes
+        self.graph = {key: references(node.xmln) & nodes.keys()
+                      for key, node in nodes.items() if not key.startswith('!')}
+        self.stops: Dict[str, Tuple['Stop']] = {}
+
+    def order(self) -> List[str]:
+        try:
+            return list(TopologicalSorter(self.graph).static_order())
+        except CycleError:
+            return sorted(self.graph)
+
+    def chain(self, key: str) -> Iterator['Node']:
+        """The element with key, then those it inherits from through href."""
+        seen = set()
+        while key in self.nodes and key not in seen:
+            seen.add(key)
+            yield self.nodes[key]
+            attrib = self.nodes[key].xmln.attrib
+            href = attrib.get('{http://www.w3.org/1999/xlink}href', attrib.get('href', ''))
+            key = href[1:] if href.startswith('#') else None
+
+    def resolve(self, key: str) -> Tuple['Stop']:
+        if key in self.stops: return self.stops[key]
+        self.stops[key] = ()
+        for node in self.chain(key):
+            stops = [Node(element) for element in node.xmln if 'stop' in element.tag]
+            if not stops: continue
+            self.stops[key] = tuple(
+                Stop(stop.properties['offset'], Color(color.r, color.g, color.b,
+                     stop.properties.get('stop-opacity', color.alpha)))
+                for stop in stops if (color := stop.properties['stop-color']))
+            break
+        return self.stops[key]
+
+@dataclass(frozen=True, slots=True)
 class Dimension:
     value: int
     unit: str
@@ -47,15 +220,19 @@ class Dimension:
         assert self.unit == other.unit
         return Dimension(mix(self.value, other.value, value), self.unit)
 
+    def flat(self): return flat(self.value)
+
+    def unflat(self, values): return Dimension(unflat(self.value, values), self.unit)
+
     def __str__(self): return f'{self.value}{self.unit}'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Link:
     to: str
 
     def __str__(self): return f'url(#{self.to})'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Color:
     r: int
     g: int
@@ -68,10 +245,16 @@ class Color:
                      int(mix(self.b, other.b, value)),
                      mix(self.alpha, other.alpha, value),)
 
+    def flat(self): return [self.r, self.g, self.b] + flat(self.alpha)
+
+    def unflat(self, values):
+        return Color(int(next(values)), int(next(values)), int(next(values)),
+                     unflat(self.alpha, values))
+
     def __str__(self): return f'#{self.r:02x}{self.g:02x}{self.b:02x}'
     #def __str__(self): return f'rgba({self.r}, {self.g}, {self.b}, {self.alpha})'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Function:
     name: str
     arguments: Tuple
@@ -79,48 +262,92 @@ class Function:
     def __str__(self):
         return f'{self.name}({", ".join(map(str, self.arguments))})'
 
-@dataclass(frozen=True)
+    def flat(self): return flat(self.arguments)
+
+    def unflat(self, values): return Function(self.name, unflat(self.arguments, values))
+
+@dataclass(frozen=True, slots=True)
 class SorryWhat:
     content: str
 
     def __str__(self): return self.content
 
+@lru_cache(maxsize=8192)
+def parse_value(value: str, single: bool = True):
+    css = Node.parse_css(tinycss2.parse_component_value_list(value))
+    return css[0] if single and len(css) == 1 else css
+
+@lru_cache(maxsize=2048)
+def parse_style(style: str) -> Tuple[Tuple[str, object]]:
+    rules = []
+    for decl in Node.clean(parse_declaration_list(style)):
+        css = Node.parse_css(decl.value)
+        if decl.name not in ('transform', 'gradientTransform') and len(css)==1:
+            css = css[0]
+        rules.append((decl.name, css))
+    return tuple(rules)
+
+def cache_info() -> Dict[str, tuple]:
+    return {'value': parse_value.cache_info(), 'style': parse_style.cache_info()}
+
 class Node:
 
     def __init__(self, xmln):
         self.xmln = xmln
         self.name = xmln.tag.partition('}')[2]
+        self.dirty = {}
+
+    def __getattr__(self, name):
+        # properties are parsed on first use, most elements never need them
+        if name not in ('properties', '_properties_loc'): raise AttributeError(name)
+        self.parse()
+        return self.__dict__[name]
+
+    def parse(self):
         self.properties = {}
         self._properties_loc = {}
         for key, value in self.xmln.attrib.items():
-            if key in ('style', 'id'): continue
-            css = self.parse_css(tinycss2.parse_component_value_list(value))
-            if key not in ('transform', 'gradientTransform') and len(css)==1:
-                css = css[0]
-            self.properties[key] = css
+            if key in ('style', 'id', 'd', 'points'): continue
+            self.properties[key] = parse_value(value, key not in ('transform', 'gradientTransform'))
             self._properties_loc[key] = 'attrib'
-        declarations = parse_declaration_list(self.xmln.attrib.get('style', ''))
-        for decl in self.clean(declarations):
-            css = self.parse_css(decl.value)
-            if decl.name not in ('transform', 'gradientTransform') and len(css)==1:
-                css = css[0]
-            self.properties[decl.name] = css
-            self._properties_loc[decl.name] = 'style'
+        for name, css in parse_style(self.xmln.attrib.get('style', '')):
+            self.properties[name] = css
+            self._properties_loc[name] = 'style'
+
+    def copy(self, xmln):
+        node = Node(xmln)
+        node.name = self.name
+        if 'properties' in self.__dict__:
+            node.properties = dict(self.properties)
+            node._properties_loc = dict(self._properties_loc)
+        return node
 
     def __setitem__(self, key, value):
         if key not in self.properties:
             self._properties_loc[key] = 'attrib'
         self.properties[key] = value
-        if not isinstance(value, list): value = [value]
-        value = ' '.join(map(str, value))
-        if self._properties_loc[key] == 'attrib':
-            self.xmln.attrib[key] = str(value)
-        elif self._properties_loc[key] == 'style':
-            css = self.xmln.attrib['style'].split(';')
-            rule = next(i for i in range(len(css))
-                        if css[i].split(':')[0].strip() == key)
-            css[rule] = css[rule].split(':')[0] + ':' + str(value)
-            self.xmln.attrib['style'] = ';'.join(css)
+        self.dirty[key] = True
+
+    def flush(self):
+        """Write the properties set since the last flush into the element."""
+        if not self.dirty: return
+        style = None
+        for key in self.dirty:
+            value = self.properties[key]
+            if not isinstance(value, list): value = [value]
+            value = ' '.join(map(str, value))
+            if self._properties_loc[key] == 'attrib':
+                self.xmln.attrib[key] = value
+            elif self._properties_loc[key] == 'style':
+                if style is None:
+                    style = [rule.split(':', 1) for rule in self.xmln.attrib['style'].split(';')]
+                    rules = {}
+                    for rule in style:
+                        if len(rule) == 2: rules.setdefault(rule[0].strip(), rule)
+                rules[key][1] = value
+        if style is not None:
+            self.xmln.attrib['style'] = ';'.join(':'.join(rule) for rule in style)
+        self.dirty.clear()
 
     @classmethod
     def parse_css(self, el):
@@ -143,7 +370,7 @@ class Node:
         return [rule for rule in rules if rule.type not in
                 ('comment', 'whitespace', 'literal')]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Stop:
     offset: int
     color: Color
@@ -152,7 +379,12 @@ class Stop:
         return Stop(mix(self.offset, other.offset, value),
                     self.color.mix(other.color, value))
 
-@dataclass(frozen=True)
+    def flat(self): return flat(self.offset) + self.color.flat()
+
+    def unflat(self, values):
+        return Stop(unflat(self.offset, values), self.color.unflat(values))
+
+@dataclass(frozen=True, slots=True)
 class Point:
     x: int
     y: int
@@ -160,7 +392,11 @@ class Point:
     def mix(self, other, value: int):
         return Point(mix(self.x, other.x, value), mix(self.y, other.y, value))
 
-@dataclass(frozen=True)
+    def flat(self): return flat(self.x) + flat(self.y)
+
+    def unflat(self, values): return Point(unflat(self.x, values), unflat(self.y, values))
+
+@dataclass(frozen=True, slots=True)
 class Transforms:
     translate: Tuple[int] = (0, 0)
     rotate: int = (0, 0, 0)
@@ -179,17 +415,242 @@ class Transforms:
                           self.mix_tuple(self.scale, other.scale, value),
                           self.mix_tuple(self.matrix, other.matrix, value),)
 
-class Gradient:
+    @staticmethod
+    def decompose(a, b, c, d, e, f) -> Dict[str, Tuple[int]]:
+        angle = atan2(b, a)
+        scale = (hypot(a, b), d*cos(angle) - c*sin(angle))
+        skew = atan((c*cos(angle) + d*sin(angle)) / scale[1]) if scale[1] else 0
+        return {'translate': (e, f), 'rotate': (degrees(angle),),
+                'skewX': (degrees(skew),), 'scale': scale}
+
+    def flat(self):
+        return flat((self.translate, self.rotate, self.skew, self.scale, self.matrix))
+
+    def unflat(self, values):
+        return Transforms(*unflat((self.translate, self.rotate, self.skew,
+                                   self.scale, self.matrix), values))
+
+class Curve:
+    """Path geometry as cubic Bézier subpaths sharing one (n, 2) point array.
+
+    A subpath of k segments owns 3k+1 consecutive points: its start point
+    followed by the two control points and the end point of every segment.
+    """
+
+    def __init__(self, points: np.ndarray, sizes: Tuple[int], closed: Tuple[bool]):
+        self.points, self.sizes, self.closed = points, sizes, closed
+
+    @classmethod
+    def from_path(cls, path: svgpath.Path) -> 'Curve':
+        subpaths, closed, current = [], [], None
+        for segment in path:
+            if isinstance(segment, svgpath.Move):
+                current = None
+                subpaths.append([segment.end])
+                closed.append(False)
+                continue
+            if current is None and not (subpaths and len(subpaths[-1]) == 1):
+                subpaths.append([segment.start])
+                closed.append(False)
+            current = subpaths[-1]
+            if isinstance(segment, svgpath.Close):
+                closed[-1] = True
+                if segment.start != segment.end:
+                    current += cls.line(segment.start, segment.end)
+                current = None
+            elif isinstance(segment, svgpath.CubicBezier):
+                current += [segment.control1, segment.control2, segment.end]
+            elif isinstance(segment, svgpath.QuadraticBezier):
+                current += [segment.start + (segment.control - segment.start)*2/3,
+                            segment.end + (segment.control - segment.end)*2/3, segment.end]
+            elif isinstance(segment, svgpath.Arc) and segment.start != segment.end \
+                    and segment.radius.real and segment.radius.imag:
+                current += cls.arc(segment)
+            else:
+                current += cls.line(segment.start, segment.end)
+        points = [point for subpath in subpaths for point in subpath]
+        return cls(np.array([(p.real, p.imag) for p in points], dtype=float).reshape(-1, 2),
+                   tuple(map(len, subpaths)), tuple(closed))
+
+    @staticmethod
+    def line(start: complex, end: complex) -> List[complex]:
+        return [start + (end - start)/3, start + (end - start)*2/3, end]
+
+    @staticmethod
+    def arc(arc: svgpath.Arc) -> List[complex]:
+        pieces = max(1, ceil(abs(arc.delta) / 90))
+        step = radians(arc.delta / pieces)
+        handle = 4/3 * tan(step/4)
+        rotation = complex(cos(radians(arc.rotation)), sin(radians(arc.rotation)))
+        radius = arc.radius * arc.radius_scale
+
+        def tangent(angle):
+            return rotation * complex(-sin(angle)*radius.real, cos(angle)*radius.imag)
+
+        points = []
+        for piece in range(pieces):
+            one, two = radians(arc.theta) + step*piece, radians(arc.theta) + step*(piece+1)
+            start, end = arc.point(piece/pieces), arc.point((piece+1)/pieces)
+            points += [start + handle*tangent(one), end - handle*tangent(two), end]
+        points[-1] = arc.end
+        return points
+
+    def subpaths(self) -> Iterator[np.ndarray]:
+        offset = 0
+        for size in self.sizes:
+            yield self.points[offset:offset+size]
+            offset += size
+
+    def reconcile(self, other: 'Curve') -> Tuple['Curve', 'Curve']:
+        if self.sizes == other.sizes and self.closed == other.closed: return self, other
+        mine, theirs = list(self.subpaths()), list(other.subpaths())
+        for one, two in ((mine, theirs), (theirs, mine)):
+            while len(one) < len(two):
+                one.append(one[-1][-1:] if one else two[len(one)][:1])
+        # closing edges are among the points already: Z only joins them, and
+        # is kept where both ends have it so that neither end gains a join
+        pad = lambda closed: closed + (False,)*(len(mine) - len(closed))
+        closed = tuple(a and b for a, b in zip(pad(self.closed), pad(other.closed)))
+        for i, (one, two) in enumerate(zip(mine, theirs)):
+            if len(one) < len(two): mine[i] = self.split(one, (len(two) - 1) // 3)
+            elif len(two) < len(one): theirs[i] = self.split(two, (len(one) - 1) // 3)
+        sizes = tuple(map(len, mine))
+        return (Curve(np.concatenate(mine), sizes, closed),
+                Curve(np.concatenate(theirs), sizes, closed))
+
+    @staticmethod
+    def split(subpath: np.ndarray, count: int) -> np.ndarray:
+        """Subdivide the segments of subpath until there are count of them."""
+        if len(subpath) == 1: return np.repeat(subpath, 3*count + 1, axis=0)
+        segments = np.stack([subpath[0:-1:3], subpath[1::3], subpath[2::3], subpath[3::3]], axis=1)
+        lengths = np.linalg.norm(np.diff(segments, axis=1), axis=2).sum(axis=1) + 1e-12
+        share = (count - len(segments)) * lengths / lengths.sum()
+        pieces = 1 + np.floor(share).astype(int)
+        remainder = np.argsort(np.floor(share) - share)[:count - pieces.sum()]
+        pieces[remainder] += 1
+        owner = np.repeat(np.arange(len(segments)), pieces)
+        first = np.cumsum(pieces) - pieces
+        t0 = ((np.arange(count) - first[owner]) / pieces[owner])[:, None]
+        t1 = t0 + 1 / pieces[owner][:, None]
+        p = segments[owner]
+
+        def blossom(u, v, w):
+            q = [(1-u)*p[:, i] + u*p[:, i+1] for i in range(3)]
+            r = [(1-v)*q[i] + v*q[i+1] for i in range(2)]
+            return (1-w)*r[0] + w*r[1]
+
+        controls = np.stack([blossom(t0, t0, t1), blossom(t0, t1, t1), blossom(t1, t1, t1)], axis=1)
+        return np.concatenate([subpath[:1], controls.reshape(-1, 2)])
+
+    def mix(self, other: 'Curve', value: int) -> 'Curve':
+        one, two = self.reconcile(other)
+        return Curve(one.points*(1-value) + two.points*value, one.sizes, one.closed)
+
+    def flat(self) -> np.ndarray: return self.points.ravel()
+
+    def unflat(self, values: Iterator[float]) -> 'Curve':
+        points = np.fromiter(values, dtype=float, count=self.points.size)
+        return Curve(points.reshape(-1, 2), self.sizes, self.closed)
+
+    def __eq__(self, other):
+        return (isinstance(other, Curve) and self.sizes == other.sizes and
+                self.closed == other.closed and np.array_equal(self.points, other.points))
+
+    def __str__(self):
+        coordinates = ['%.8g,%.8g' % (x, y) for x, y in self.points.tolist()]
+        d, offset = [], 0
+        for size, closed in zip(self.sizes, self.closed):
+            d.append('M ' + coordinates[offset])
+            if size > 1: d.append('C ' + ' '.join(coordinates[offset+1:offset+size]))
+            if closed: d.append('Z')
+            offset += size
+        return ' '.join(d)
+
+class Vertices:
+    """Polyline or polygon corners as one (n, 2) coordinate array."""
+
+    number = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+    def __init__(self, points: np.ndarray, closed: bool = False):
+        self.points, self.closed = points, closed
+
+    @classmethod
+    def parse(cls, points: str, closed: bool = False) -> 'Vertices':
+        coordinates = np.array(cls.number.findall(points), dtype=float)
+        return cls(coordinates[:len(coordinates)//2*2].reshape(-1, 2), closed)
+
+    def lengths(self) -> np.ndarray:
+        """Normalized arc length at every vertex (and at the closing one)."""
+        points = np.concatenate([self.points, self.points[:1]]) if self.closed else self.points
+        length = np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+        if length[-1] == 0: return np.linspace(0, 1, len(points))
+        return length / length[-1]
+
+    def resample(self, at: np.ndarray) -> 'Vertices':
+        points = np.concatenate([self.points, self.points[:1]]) if self.closed else self.points
+        along = self.lengths()
+        return Vertices(np.stack([np.interp(at, along, points[:, 0]),
+                                  np.interp(at, along, points[:, 1])], axis=1), self.closed)
+
+    def reconcile(self, other: 'Vertices') -> Tuple['Vertices', 'Vertices']:
+        if len(self.points) == len(other.points): return self, other
+        # an empty side grows out of, or shrinks into, the other's first vertex
+        if not len(self.points):
+            return Vertices(np.repeat(other.points[:1], len(other.points), axis=0), self.closed), other
+        if not len(other.points):
+            return self, Vertices(np.repeat(self.points[:1], len(self.points), axis=0), other.closed)
+        mine, theirs = self.lengths(), other.lengths()
+        if self.closed: mine = mine[:-1]
+        if other.closed: theirs = theirs[:-1]
+        at = np.union1d(mine, theirs)
+        return self.resample(at), other.resample(at)
+
+    def mix(self, other: 'Vertices', value: int) -> 'Vertices':
+        one, two = self.reconcile(other)
+        return Vertices(one.points*(1-value) + two.points*value, one.closed)
+
+    def flat(self) -> np.ndarray: return self.points.ravel()
+
+    def unflat(self, values: Iterator[float]) -> 'Vertices':
+        points = np.fromiter(values, dtype=float, count=self.points.size)
+        return Vertices(points.reshape(-1, 2), self.closed)
+
+    def __eq__(self, other):
+        return (isinstance(other, Vertices) and self.closed == other.closed and
+                np.array_equal(self.points, other.points))
+
+    def __str__(self):
+        return ' '.join(['%.8g,%.8g'] * len(self.points)) % tuple(self.points.ravel().tolist())
+
+class Element:
+    channels: Tuple[str] = ()
 
     def __init__(self, node: Node, nodes: Dict[str, Node]):
         self.node, self.nodes = node, nodes
 
+    def get(self, name: str, default=None):
+        return self.node.properties.get(name, default)
+
     def mix(self, other, value: int):
-        self.transforms = self.transforms.mix(other.transforms, value)
-        assert len(self.stops) == len(other.stops)
-        self.stops = tuple(s.mix(o, value) for s, o in zip(self.stops, other.stops))
+        for name in self.channels:
+            if (mine := getattr(self, name)) is not None:
+                setattr(self, name, mix(mine, getattr(other, name), value))
+        self.node.flush()
         return self
 
+class Gradient(Element):
+    channels = ('transforms', 'stops')
+
+    @property
+    def resources(self) -> Resources:
+        return self.nodes.get('!resources') or Resources(self.nodes)
+
+    def get(self, name: str, default=None):
+        """Attribute of the gradient or of the first one it inherits it from."""
+        for node in self.resources.chain(self.node.xmln.attrib.get('id')):
+            if name in node.properties: return node.properties[name]
+        return self.node.properties.get(name, default)
+
     @property
     def transforms(self) -> Transforms:
         return Drawable.read_transforms(self, 'gradientTransform')
@@ -200,22 +661,12 @@ class Gradient:
 
     @property
     def stops(self) -> Tuple[Stop]:
-        stops = []
-        for element in self.node.xmln:
-            if not 'stop' in element.tag: continue
-            stop = Node(element)
-            color = stop.properties['stop-color']
-            opacity = stop.properties.get('stop-opacity', color.alpha)
-            stops.append(Stop(stop.properties['offset'],
-                              Color(color.r, color.g, color.b, opacity)))
-        if stops: return tuple(stops)
-        xlink = '{http://www.w3.org/1999/xlink}'
-        if f'{xlink}href' not in self.node.properties: return ()
-        myclass = Gradient(self.nodes[self.node.properties[f'{xlink}href'].content.lstrip('#')], self.nodes)
-        return myclass.stops
+        return self.resources.resolve(self.node.xmln.attrib.get('id'))
 
     @stops.setter
     def stops(self, value: Tuple[Stop]):
+        if (resources := self.nodes.get('!resources')):
+            resources.stops.pop(self.node.xmln.attrib.get('id'), None)
         for child in list(self.node.xmln):
             self.node.xmln.remove(child)
         for stop in value:
@@ -223,21 +674,16 @@ class Gradient:
             stopel['offset'] = stop.offset
             stopel['stop-color'] = stop.color
             stopel['stop-opacity'] = stop.color.alpha
+            stopel.flush()
 
     stops: Tuple[Stop]
 
 class LinearGradient(Gradient):
-
-    def mix(self, other, value: int):
-        self.origin = self.origin.mix(other.origin, value)
-        self.target = self.target.mix(other.target, value)
-        super().mix(other, value)
-        return self
+    channels = ('origin', 'target') + Gradient.channels
 
     @property
     def origin(self) -> Point:
-        return Point(self.node.properties.get('x1', 0),
-                     self.node.properties.get('y1', 0))
+        return Point(self.get('x1', 0), self.get('y1', 0))
 
     @origin.setter
     def origin(self, value: Point):
@@ -246,27 +692,18 @@ class LinearGradient(Gradient):
 
     @property
     def target(self) -> Point:
-        return Point(self.node.properties.get('x2', 0),
-                     self.node.properties.get('y2', 0))
+        return Point(self.get('x2', Dimension(100, '%')), self.get('y2', 0))
 
     @target.setter
     def target(self, value: Point):
         self.node['x2'], self.node['y2'] = value.x, value.y
 
 class RadialGradient(Gradient):
-
-    def mix(self, other, value: int):
-        self.center = self.center.mix(other.center, value)
-        self.focal = self.focal.mix(other.focal, value)
-        self.radius = mix(self.radius, other.radius, value)
-        self.focal_radius = mix(self.focal_radius, other.focal_radius, value)
-        super().mix(other, value)
-        return self
+    channels = ('center', 'focal', 'radius', 'focal_radius') + Gradient.channels
 
     @property
     def center(self) -> Point:
-        return Point(self.node.properties['cx'],
-                     self.node.properties['cy'])
+        return Point(self.get('cx', Dimension(50, '%')), self.get('cy', Dimension(50, '%')))
 
     @center.setter
     def center(self, value: Point):
@@ -275,8 +712,8 @@ class RadialGradient(Gradient):
 
     @property
     def focal(self) -> Point:
-        return Point(self.node.properties.get('fx',0),
-                     self.node.properties.get('fy',0))
+        center = self.center
+        return Point(self.get('fx', center.x), self.get('fy', center.y))
 
     @focal.setter
     def focal(self, value: Point):
@@ -285,7 +722,7 @@ class RadialGradient(Gradient):
 
     @property
     def radius(self) -> Point:
-        return self.node.properties['r']
+        return self.get('r', Dimension(50, '%'))
 
     @radius.setter
     def radius(self, value: Point):
@@ -293,13 +730,13 @@ class RadialGradient(Gradient):
 
     @property
     def focal_radius(self) -> Point:
-        return self.node.properties.get('fr', 0)
+        return self.get('fr', 0)
 
     @focal_radius.setter
     def focal_radius(self, value: Point):
         self.node['fr'] = value
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Stroke:
     color: Optional[Union[Color, LinearGradient, RadialGradient]]
     width: Optional[int] = 0
@@ -311,18 +748,18 @@ class Stroke:
         return Stroke(self.color.mix(other.color, value) if self.color else None,
                       mix(self.width, other.width, value) if self.width else None)
 
-class Drawable:
+    def flat(self): return flat(self.color) + (flat(self.width) if self.width else [])
 
-    def __init__(self, node: Node, nodes: Dict[str, Node]):
-        self.node, self.nodes = node, nodes
+    def unflat(self, values):
+        return Stroke(unflat(self.color, values),
+                      unflat(self.width, values) if self.width else None)
+
+class Drawable(Element):
+    channels = ('fill', 'stroke', 'blur', 'transforms')
 
     def mix(self, other, value: int):
         assert type(self.fill) == type(other.fill)
-        if self.fill:
-            self.fill = self.fill.mix(other.fill, value)
-        self.stroke = self.stroke.mix(other.stroke, value)
-        self.blur = mix(self.blur, other.blur, value)
-        self.transforms = self.transforms.mix(other.transforms, value)
+        return super().mix(other, value)
 
     def read_color(self, color, opacity):
         c = self.node.properties.get(color, None)
@@ -365,37 +802,38 @@ class Drawable:
             self.node['stroke-width'] = value.width
 
     @property
-    def blur(self) -> int:
-        if 'filter' not in self.node.properties: return 0
+    def blurel(self) -> Optional[ET.Element]:
+        if 'filter' not in self.node.properties: return None
         self.filt = self.nodes[self.node.properties['filter'].to].xmln
-        for element in self.filt.iter():
-            if 'feGaussianBlur' not in element.tag: continue
-            self.blurel = element
-            return float(element.attrib['stdDeviation'])
+        return next((element for element in self.filt.iter()
+                     if 'feGaussianBlur' in element.tag), None)
+
+    @property
+    def blur(self) -> int:
+        if (blurel := self.blurel) is None: return 0
+        return float(blurel.attrib['stdDeviation'])
 
     @blur.setter
     def blur(self, value: int):
-        if not hasattr(self, 'blurel'):
+        if (blurel := self.blurel) is None:
             if value == 0: return
-            defs = self.nodes['!defs']
-            filterid = f'filter{randint(0, 10000)}'
-            self.node['filter'] = Link(filterid)
-            self.filt = ET.SubElement(defs.xmln, 'filter')
-            self.filt.attrib['id'] = filterid
-            self.nodes[filterid] = Node(self.filt)
-            self.blurel = ET.SubElement(self.filt, 'feGaussianBlur')
-        self.blurel.attrib['stdDeviation'] = str(value)
-        self.filt.attrib['x'] = '-1'
-        self.filt.attrib['y'] = '-1'
-        self.filt.attrib['width'] = '3'
-        self.filt.attrib['height'] = '3'
+            self.node['filter'] = Link(Blur.allocate(self.nodes, value).node.xmln.attrib['id'])
+        else:
+            Blur(self.nodes[self.node.properties['filter'].to], self.nodes).deviation = value
+
+    @property
+    def simple(self) -> bool:
+        """Whether the element is unfiltered or filtered by a lone blur."""
+        if 'filter' not in self.node.properties: return True
+        return isinstance(self.node.properties['filter'], Link) and \
+            self.blurel is not None and len(self.filt) == 1
 
     @property
     def transforms(self) -> Transforms:
         return self.read_transforms('transform')
 
     def read_transforms(self, name):
-        nodetransfs = self.node.properties.get(name, [])
+        nodetransfs = self.get(name, [])
         args = {'translate': (0, 0), 'rotate': (0, 0, 0), 'skewX': (0,),
                 'skewY': (0,), 'scale': (1, 1), 'matrix': (1, 0, 0, 1, 0, 0)}
         args.update({t.name: t.arguments for t in nodetransfs
@@ -421,13 +859,34 @@ class Drawable:
         self.node[name] = [Function(key, value) for key, value in args.items()]
 
 
-class Rect(Drawable):
+class Blur(Element):
+    """Gaussian blur filter, possibly shared by several elements."""
 
-    def mix(self, other, value: int):
-        self.position = self.position.mix(other.position, value)
-        self.size = self.size.mix(other.size, value)
-        self.roundness = self.roundness.mix(other.roundness, value)
-        super().mix(other, value)
+    channels = ('deviation',)
+
+    @staticmethod
+    def allocate(nodes: Dict[str, Node], value: int, attrib: Tuple = ()) -> 'Blur':
+        """Add a blur filter to the defs of nodes, under the first free id."""
+        key = next(f'blur{k}' for k in range(len(nodes) + 1) if f'blur{k}' not in nodes)
+        filt = ET.SubElement(nodes['!defs'].xmln, 'filter', dict(attrib), id=key, x='-1',
+                             y='-1', width='3', height='3')
+        ET.SubElement(filt, 'feGaussianBlur', stdDeviation=str(value))
+        nodes[key] = Node(filt)
+        return Blur(nodes[key], nodes)
+
+    @property
+    def deviation(self) -> int:
+        blurel = next(element for element in self.node.xmln if 'feGaussianBlur' in element.tag)
+        return float(blurel.attrib['stdDeviation'])
+
+    @deviation.setter
+    def deviation(self, value: int):
+        blurel = next(element for element in self.node.xmln if 'feGaussianBlur' in element.tag)
+        blurel.attrib['stdDeviation'] = str(value)
+        self.node.xmln.attrib.update(x='-1', y='-1', width='3', height='3')
+
+class Rect(Drawable):
+    channels = ('position', 'size', 'roundness') + Drawable.channels
 
     @property
     def position(self) -> Point:
@@ -459,11 +918,7 @@ class Rect(Drawable):
         self.node['ry'] = value.y
 
 class Ellipse(Drawable):
-
-    def mix(self, other, value: int):
-        self.center = self.center.mix(other.center, value)
-        self.radius = self.radius.mix(other.radius, value)
-        super().mix(other, value)
+    channels = ('center', 'radius') + Drawable.channels
 
     @property
     def center(self) -> Point:
@@ -485,17 +940,13 @@ class Ellipse(Drawable):
     @radius.setter
     def radius(self, value: Point):
         if self.node.name == 'circle':
-            self.node.xmln.tag = self.node.name = 'ellipse'
+            self.node.xmln.tag = self.node.xmln.tag[:-len('circle')] + 'ellipse'
+            self.node.name = 'ellipse'
         self.node['rx'] = value.x
         self.node['ry'] = value.y
 
 class Text(Drawable):
-
-    def mix(self, other, value: int):
-        self.text = strmix(self.text, other.text, value)
-        self.position = self.position.mix(other.position, value)
-        self.font_size = mix(self.font_size, other.font_size, value)
-        super().mix(other, value)
+    channels = ('text', 'position', 'font_size') + Drawable.channels
 
     @property
     def position(self) -> Point:
@@ -523,11 +974,7 @@ class Text(Drawable):
         self.node.xmln.text = value
 
 class Line(Drawable):
-
-    def mix(self, other, value: int):
-        self.origin = self.origin.mix(other.origin, value)
-        self.target = self.target.mix(other.target, value)
-        super().mix(other, value)
+    channels = ('origin', 'target') + Drawable.channels
 
     @property
     def origin(self) -> Point:
@@ -549,46 +996,1341 @@ class Line(Drawable):
         self.node['x2'], self.node['y2'] = value.x, value.y
 
 class PolyLine(Drawable):
-
-    def mix(self, other, value: int):
-        super().mix(other, value)
-        return #TODO
+    channels = ('points',) + Drawable.channels
 
     @property
-    def points(self) -> Tuple[Point]:
-        points = self.node.xmln.attrib['points'].split()
-        return tuple(Point(*map(int, p.split(','))) for p in points)
+    def points(self) -> Vertices:
+        return Vertices.parse(self.node.xmln.attrib.get('points', ''),
+                              self.node.name == 'polygon')
 
     @points.setter
-    def points(self, value: Tuple[Point]):
-        self.node.xmln.attrib['points'] = ' '.join(f'{p.x},{p.y}' for p in value)
+    def points(self, value: Vertices):
+        self.node.xmln.attrib['points'] = str(value)
 
 class Path(Drawable):
+    channels = ('curve',) + Drawable.channels
 
-    def mix(self, other, value: int):
-        super().mix(other, value)
-        return #TODO
+    @property
+    def curve(self) -> Curve:
+        return Curve.from_path(self.instructions)
+
+    @curve.setter
+    def curve(self, value: Curve):
+        self.node.xmln.attrib['d'] = str(value)
 
     @property
-    def instructions(self) -> Path:
-        return parse_path(self.node.xmln.attrib['d'])
+    def instructions(self) -> svgpath.Path:
+        return svgpath.parse_path(self.node.xmln.attrib['d'])
 
     @instructions.setter
-    def instructions(self, value: Path):
+    def instructions(self, value: svgpath.Path):
         self.node.xmln.attrib['d'] = value.d()
 
+@dataclass
+class Channel:
+    key: str
+    cls: type
+    name: str
+    start: object
+    end: object
+    span: Optional[slice] = None
+    script: Optional[EditScript] = None
+
+    def __post_init__(self):
+        if isinstance(self.start, str):
+            self.script = EditScript(self.start, self.end)
+
+    def mix(self, value: int):
+        if self.script is not None: return self.script(value)
+        return mix(self.start, self.end, value)
+
+    def vectorizable(self) -> bool:
+        numbers = flat(self.end)
+        return (len(flat(self.start)) == len(numbers) and
+                unflat(self.start, iter(numbers)) == unflat(self.end, iter(numbers)))
+
+class Animation:
+    batch = 2**22
+
+    def __init__(self, source, target, metrics: Optional[Metrics] = None):
+        self.metrics = metrics
+        with timed(metrics, 'parse'):
+            self.tree, other = ET.parse(source), ET.parse(target)
+        with timed(metrics, 'node'):
+            self.nodes, nodes = index(self.tree.getroot()), index(other.getroot())
+        self.channels = []
+        self._compiled = set()
+        self._blurs: Dict[Tuple, List[Drawable]] = {}
+        with timed(metrics, 'compile'):
+            # resources are compiled before their users, so that every frame
+            # writes each of them once and in dependency order
+            for key in self.nodes['!resources'].order():
+                if key not in nodes: continue
+                if (obj := objectify(self.nodes[key], self.nodes)) and isinstance(obj, Drawable):
+                    self.compile(obj, objectify(nodes[key], nodes))
+            self.allocate()
+            self.settle()
+        self.elements = len({channel.key for channel in self.channels})
+        if metrics is not None: metrics.count('resources', len(self._blurs))
+        start, end, size = [], [], 0
+        for channel in self.channels:
+            if not channel.vectorizable(): continue
+            start.append(np.asarray(flat(channel.start), dtype=float))
+            end.append(np.asarray(flat(channel.end), dtype=float))
+            channel.span = slice(size, size + len(start[-1]))
+            size += len(start[-1])
+        self.start = np.concatenate(start) if start else np.zeros(0)
+        self.end = np.concatenate(end) if end else np.zeros(0)
+
+    def compile(self, obj: Element, other: Element):
+        key = obj.node.xmln.attrib['id']
+        if key in self._compiled: return
+        self._compiled.add(key)
+        # every channel is read once: properties like fill parse on each read
+        values = [(name, getattr(obj, name), getattr(other, name)) for name in obj.channels]
+        for name, start, end in values:
+            if name == 'fill': assert type(start) == type(end)
+            if isinstance(start, Stroke): start, end = start.color, end.color
+            if isinstance(start, Gradient):
+                assert type(start) == type(end)
+                self.compile(start, end)
+        for name, start, end in values:
+            if isinstance(start, Gradient): continue
+            if name == 'blur' and obj.simple:
+                if start or end:
+                    attrib = () if obj.blurel is None else tuple(sorted(
+                        (name, value) for name, value in obj.filt.attrib.items()
+                        if name not in ('id', 'x', 'y', 'width', 'height')))
+                    self._blurs.setdefault((start, end, attrib), []).append(obj)
+                continue
+            if isinstance(start, Stroke) and isinstance(start.color, Gradient):
+                start, end = Stroke(None, start.width), Stroke(None, end.width)
+            if isinstance(obj, Gradient) and self.kind(start) != self.kind(end):
+                # a default percentage against a number given on the other end
+                start, end = self.numbers(obj, start, name), self.numbers(other, end, name)
+            if hasattr(start, 'reconcile'):
+                start, end = start.reconcile(end)
+            if start is not None:
+                self.channels.append(Channel(key, type(obj), name, start, end))
+
+    @staticmethod
+    def kind(value):
+        if isinstance(value, Point): return Animation.kind(value.x), Animation.kind(value.y)
+        return value.unit if isinstance(value, Dimension) else None
+
+    def numbers(self, gradient: Gradient, value, axis: str):
+        """Percentages of value, a coordinate or length of gradient, as the
+        numbers they stand for in the units of the gradient."""
+        if isinstance(value, Point):
+            return Point(self.numbers(gradient, value.x, 'x'), self.numbers(gradient, value.y, 'y'))
+        if not isinstance(value, Dimension) or value.unit != '%': return value
+        if str(gradient.get('gradientUnits', '')) != 'userSpaceOnUse': return value.value / 100
+        root = self.tree.getroot()
+        if len(box := Vertices.number.findall(root.attrib.get('viewBox', ''))) == 4:
+            width, height = float(box[2]), float(box[3])
+        else:
+            width, height = (float(next(iter(Vertices.number.findall(root.attrib.get(name, ''))),
+                                        100)) for name in ('width', 'height'))
+        return value.value / 100 * {'x': width, 'y': height}.get(axis, hypot(width, height) / sqrt(2))
+
+    def allocate(self):
+        """Give every group of elements blurred alike one shared filter.
+
+        Filters are added to the template once, with ids in compile order,
+        so frames only set their deviation and come out the same every run.
+        """
+        channels = []
+        for (start, end, attrib), users in self._blurs.items():
+            blur = Blur.allocate(self.nodes, start, attrib)
+            for obj in users:
+                obj.node['filter'] = Link(blur.node.xmln.attrib['id'])
+                obj.node.flush()
+            channels.append(Channel(blur.node.xmln.attrib['id'], Blur, 'deviation', start, end))
+        self.channels[:0] = channels
+        self.nodes['!resources'] = Resources(self.nodes)
+
+    def settle(self):
+        """Write the channels that are the same on both ends into the
+        template once, so that frames only mix the ones that change."""
+        static = [channel for channel in self.channels if channel.start == channel.end]
+        self.channels = [channel for channel in self.channels if channel.start != channel.end]
+        key = element = None
+        for channel in static:
+            if channel.key != key:
+                key, element = channel.key, channel.cls(self.nodes[channel.key], self.nodes)
+            # as the mixed frames would write it, with numbers as floats
+            value = (unflat(channel.start, map(float, flat(channel.start)))
+                     if channel.vectorizable() else channel.mix(0))
+            setattr(element, channel.name, value)
+        for key in {channel.key for channel in static}:
+            self.nodes[key].flush()
+
+    def animated(self) -> set:
+        """Ids of the elements whose rendering can differ between frames."""
+        animated = {channel.key for channel in self.channels if channel.start != channel.end}
+        dependencies = self.nodes['!resources'].graph
+        while (more := {key for key, targets in dependencies.items()
+                        if key not in animated and targets & animated}):
+            animated |= more
+        return animated
+
+    def rows(self, values: List[float]) -> Iterator[Tuple[float, np.ndarray]]:
+        values = np.asarray(values, dtype=float)
+        size = max(1, self.batch // max(1, len(self.start)))
+        for batch in range(0, len(values), size):
+            column = values[batch:batch+size, None]
+            matrix = self.start*(1-column) + self.end*column
+            yield from zip(column[:, 0].tolist(), matrix)
+
+    def frames(self, values: List[float]) -> Iterator[ET.ElementTree]:
+        for value, row in self.rows(values):
+            root, nodes = self.clone()
+            self.write(nodes, value, row)
+            yield ET.ElementTree(root)
+
+    def frame(self, value: int) -> ET.ElementTree:
+        return next(self.frames([value]))
+
+    def clone(self) -> Tuple[ET.Element, Dict[str, Node]]:
+        root = deepcopy(self.tree.getroot())
+        nodes = {key: self.nodes[key].copy(element) for element in root.iter()
+                 if (key := element.attrib.get('id')) in self.nodes}
+        nodes['!defs'] = Node(next(root.iter('{http://www.w3.org/2000/svg}defs')))
+        return root, nodes
+
+    def write(self, nodes: Dict[str, Node], value: int, row: np.ndarray):
+        key = element = None
+        for channel in self.channels:
+            # the channels of an element are consecutive: wrap its node once
+            if channel.key != key:
+                key, element = channel.key, channel.cls(nodes[channel.key], nodes)
+            if self.metrics is None:
+                self.apply(channel, element, value, row)
+                continue
+            with self.metrics.timed(f'mix:{channel.cls.__name__}', element=channel.key):
+                self.apply(channel, element, value, row)
+        for node in nodes.values():
+            node.flush()
+        if self.metrics is not None: self.metrics.count('elements', self.elements)
+
+    @staticmethod
+    def apply(channel: Channel, element: Element, value: int, row: np.ndarray):
+        if channel.span is not None:
+            result = unflat(channel.start, iter(row[channel.span].tolist()))
+        else:
+            result = channel.mix(value)
+        setattr(element, channel.name, result)
+
+    def smil(self, keyframes: int = 2, duration: float = 1,
+             repeat: bool = False) -> ET.ElementTree:
+        # Keyframes are written last to first on one tree, so that elements
+        # created along the way exist in every snapshot and the tree is left
+        # in the state of the first keyframe.
+        if keyframes < 2: raise ValueError('an animation needs at least 2 keyframes')
+        root, nodes = self.clone()
+        snapshots = []
+        for value, row in self.rows([k/(keyframes-1) for k in reversed(range(keyframes))]):
+            self.write(nodes, value, row)
+            snapshots.insert(0, [(el.tag, dict(el.attrib)) for el in root.iter()])
+        timing = {'dur': f'{duration}s', 'fill': 'freeze'}
+        if repeat: timing['repeatCount'] = 'indefinite'
+        for element, states in zip(list(root.iter()), zip(*snapshots)):
+            assert len({tag for tag, _ in states}) == 1
+            attributes = [attrib for _, attrib in states]
+            for key in attributes[0]:
+                values = [attrib.get(key) for attrib in attributes]
+                if None in values or len(set(values)) == 1: continue
+                if key == 'style':
+                    styles = [dict(rule.split(':', 1) for rule in value.split(';') if ':' in rule)
+                              for value in values]
+                    for name in styles[0]:
+                        animate(element, name.strip(), [style.get(name) for style in styles], timing)
+                elif key in ('transform', 'gradientTransform'):
+                    animate_transform(element, key, values, timing)
+                else:
+                    animate(element, key, values, timing)
+        return ET.ElementTree(root)
+
+def animate(element: ET.Element, name: str, values: List[Optional[str]], timing: Dict[str, str]):
+    if None in values or len(set(values)) == 1: return
+    ET.SubElement(element, 'animate', attributeName=name,
+                  values=';'.join(value.strip() for value in values), **timing)
+
+def animate_transform(element: ET.Element, name: str, values: List[str],
+                      timing: Dict[str, str]):
+    steps = []
+    for value in values:
+        step = []
+        for function in Node.parse_css(tinycss2.parse_component_value_list(value)):
+            arguments = tuple(float(str(argument)) for argument in function.arguments)
+            if function.name == 'matrix':
+                step += Transforms.decompose(*arguments).items()
+            else:
+                step.append((function.name, arguments))
+        steps.append(step)
+    identity = {'translate': {(0,), (0, 0)}, 'rotate': {(0,), (0, 0, 0)},
+                'skewX': {(0,)}, 'skewY': {(0,)}, 'scale': {(1,), (1, 1)}}
+    additive = 'replace'
+    for functions in zip(*steps):
+        assert len({name for name, _ in functions}) == 1
+        kind, arguments = functions[0][0], [arguments for _, arguments in functions]
+        if all(args in identity[kind] for args in arguments): continue
+        if kind in ('rotate', 'skewX', 'skewY'):
+            # keep consecutive angles on the short way round
+            for k in range(1, len(arguments)):
+                turn = round((arguments[k][0] - arguments[k-1][0]) / 360) * 360
+                arguments[k] = (arguments[k][0] - turn,) + arguments[k][1:]
+        ET.SubElement(element, 'animateTransform', attributeName=name, type=kind,
+                      values=';'.join(' '.join(f'{x:.8g}' for x in args) for args in arguments),
+                      additive=additive, **timing)
+        additive = 'sum'
+
+def rasterize(tree: ET.ElementTree, scale: float = 1,
+              metrics: Optional[Metrics] = None) -> pyvips.Image:
+    with timed(metrics, 'serialize'):
+        data = ET.tostring(tree.getroot())
+    return pyvips.Image.new_from_buffer(data, '', scale=scale)
+
+class Layers:
+    """Rasterizer that renders the static parts of an animation only once.
+
+    The drawn elements are split, in document order, into runs that change
+    between frames and runs that do not. Static runs are rasterized from
+    the first frame and kept; every frame rasterizes its animated runs with
+    everything else hidden and composites all runs back in z-order. A
+    <use> cloning an element of another run would clone it hidden, so such
+    documents are rasterized whole.
+    """
+
+    hidden = {'defs', 'clipPath', 'mask', 'pattern', 'symbol', 'marker', 'linearGradient',
+              'radialGradient', 'filter', 'metadata', 'title', 'desc', 'style', 'script'}
+    isolating = ('opacity', 'filter', 'mask', 'clip-path')
+
+    def __init__(self, animation: Animation, scale: float = 1):
+        self.scale, self.metrics = scale, animation.metrics
+        animated = animation.animated()
+        self.runs: List[Tuple[bool, List[Tuple[int]]]] = []
+        for path, element in self.units(animation.tree.getroot()):
+            moving = any(element.attrib.get('id') in animated or references(element) & animated
+                         for element in element.iter())
+            if self.runs and self.runs[-1][0] == moving:
+                self.runs[-1][1].append(path)
+            else:
+                self.runs.append((moving, [path]))
+        self.static: Dict[int, pyvips.Image] = {}
+        self.whole = self.crossing(animation.tree.getroot())
+
+    def units(self, element: ET.Element, path: Tuple[int] = ()):
+        for k, child in enumerate(element):
+            namespace, _, name = child.tag.rpartition('}')
+            if namespace != '{http://www.w3.org/2000/svg' or name in self.hidden: continue
+            if name in ('g', 'a', 'switch') and not any(
+                    key in Node(child).properties for key in self.isolating):
+                yield from self.units(child, path + (k,))
+            else:
+                yield path + (k,), child
+
+    @staticmethod
+    def find(root: ET.Element, path: Tuple[int]) -> ET.Element:
+        for k in path: root = root[k]
+        return root
+
+    def crossing(self, root: ET.Element) -> bool:
+        """Whether a <use> of a run clones, maybe through others, another run."""
+        ids = {element.attrib['id']: element for element in root.iter() if 'id' in element.attrib}
+        owners: Dict[ET.Element, set] = {}
+        for k, (_, paths) in enumerate(self.runs):
+            for path in paths:
+                for element in self.find(root, path).iter(): owners[element] = {k}
+                for depth in range(len(path)):  # groups flattened into units
+                    owners.setdefault(self.find(root, path[:depth]), set()).add(k)
+        for k, (_, paths) in enumerate(self.runs):
+            todo = [element for path in paths for element in self.find(root, path).iter()]
+            seen = set()
+            while todo:
+                element = todo.pop()
+                if element in seen: continue
+                seen.add(element)
+                if owners.get(element, {k}) != {k}: return True
+                namespace, _, name = element.tag.rpartition('}')
+                href = element.attrib.get('{http://www.w3.org/1999/xlink}href',
+                                          element.attrib.get('href', ''))
+                if name == 'use' and (target := ids.get(href[1:])) is not None:
+                    todo.extend(target.iter())
+        return False
+
+    def render(self, root: ET.Element, run: List[Tuple[int]]) -> pyvips.Image:
+        hidden = []
+        for _, paths in self.runs:
+            if paths is run: continue
+            for path in paths:
+                element = self.find(root, path)
+                hidden.append((element, element.attrib.get('style')))
+                element.attrib['style'] = (hidden[-1][1] or '') + ';display:none'
+        image = rasterize(ET.ElementTree(root), self.scale, self.metrics)
+        for element, style in hidden:
+            if style is None: del element.attrib['style']
+            else: element.attrib['style'] = style
+        return image
+
+    def __call__(self, tree: ET.ElementTree) -> pyvips.Image:
+        if len(self.runs) < 2 or self.whole: return rasterize(tree, self.scale, self.metrics)
+        images = []
+        for k, (moving, run) in enumerate(self.runs):
+            if moving:
+                images.append(self.render(tree.getroot(), run))
+                continue
+            if k not in self.static:
+                self.static[k] = self.render(tree.getroot(), run).copy_memory()
+            images.append(self.static[k])
+        return images[0].composite(images[1:], ['over']*(len(images)-1))
+
+class Damage(Layers):
+    """Rasterizer that only redraws the part of the canvas that changed.
+
+    Every animated unit is bounded by a box in device pixels, covering its
+    stroke and filter region. The union of those boxes in the previous and
+    the current frame is rasterized alone through a cropped viewBox and
+    inserted into the previous image. Units whose extent cannot be told
+    (text on a path, <use>, markers, relative units) force a full frame.
+    """
+
+    nothing = (inf, inf, -inf, -inf)
+    pixels = {'': 1, 'px': 1, 'pt': 1, 'pc': 12, 'in': 72, 'cm': 72/2.54, 'mm': 72/25.4}
+    absolute = re.compile(r'[MLCQSTZ\s\d.,eE+-]*')
+
+    def __init__(self, animation: Animation, scale: float = 1):
+        super().__init__(animation, scale)
+        self.moving = [path for moving, paths in self.runs if moving for path in paths]
+        root = animation.tree.getroot()
+        self.filtered = [path for moving, paths in self.runs if not moving for path in paths
+                         if any('filter' in Node(element).properties
+                                for element in self.find(root, path).iter())]
+        self.image: Optional[pyvips.Image] = None
+        self.boxes: List[Tuple[int, int, int, int]] = []
+
+    @classmethod
+    def length(cls, value) -> Optional[float]:
+        if isinstance(value, (int, float)): return float(value)
+        if isinstance(value, Dimension) and value.unit in cls.pixels:
+            return value.value * cls.pixels[value.unit]
+        return None
+
+    @staticmethod
+    def affine(functions) -> Optional[np.ndarray]:
+        matrix = np.eye(3)
+        for function in functions:
+            if not isinstance(function, Function) or not all(
+                    isinstance(x, (int, float)) for x in function.arguments): return None
+            name, args = function.name, function.arguments
+            step = np.eye(3)
+            if name == 'matrix' and len(args) == 6:
+                step[:2] = np.array(args).reshape(3, 2).T
+            elif name == 'translate' and len(args) in (1, 2):
+                step[:2, 2] = args[0], args[1] if len(args) == 2 else 0
+            elif name == 'scale' and len(args) in (1, 2):
+                step[0, 0], step[1, 1] = args[0], args[-1]
+            elif name == 'rotate' and len(args) in (1, 3):
+                angle = radians(args[0])
+                step[:2, :2] = [[cos(angle), -sin(angle)], [sin(angle), cos(angle)]]
+                if len(args) == 3:
+                    step[:2, 2] = np.array(args[1:]) - step[:2, :2] @ args[1:]
+            elif name == 'skewX' and len(args) == 1: step[0, 1] = tan(radians(args[0]))
+            elif name == 'skewY' and len(args) == 1: step[1, 0] = tan(radians(args[0]))
+            else: return None
+            matrix = matrix @ step
+        return matrix
+
+    @staticmethod
+    def transform(matrix: np.ndarray, box: Tuple[float]) -> Tuple[float]:
+        if box[0] > box[2]: return box
+        x0, y0, x1, y1 = box
+        corners = matrix @ np.array([[x0, x1, x0, x1], [y0, y0, y1, y1], [1, 1, 1, 1]])
+        return (*corners[:2].min(axis=1), *corners[:2].max(axis=1))
+
+    @staticmethod
+    def union(boxes) -> Tuple[float]:
+        boxes = list(boxes)
+        if not boxes: return Damage.nothing
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    @staticmethod
+    def inherited(chain: List[Node], key: str, default=None):
+        return next((node.properties[key] for node in reversed(chain)
+                     if key in node.properties), default)
+
+    def geometry(self, node: Node, chain: List[Node]) -> Optional[Tuple[float]]:
+        """Fill box of a leaf element in its own user space."""
+        properties, name = node.properties, node.name
+        if name in ('rect', 'image'):
+            x, y, w, h = (self.length(properties.get(key, 0))
+                          for key in ('x', 'y', 'width', 'height'))
+            if None in (x, y, w, h): return None
+            return x, y, x + w, y + h
+        if name in ('circle', 'ellipse'):
+            keys = ('r', 'r') if name == 'circle' else ('rx', 'ry')
+            cx, cy, rx, ry = (self.length(properties.get(key, 0)) for key in ('cx', 'cy') + keys)
+            if None in (cx, cy, rx, ry): return None
+            return cx - rx, cy - ry, cx + rx, cy + ry
+        if name == 'line':
+            x1, y1, x2, y2 = (self.length(properties.get(key, 0))
+                              for key in ('x1', 'y1', 'x2', 'y2'))
+            if None in (x1, y1, x2, y2): return None
+            return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+        if name in ('polyline', 'polygon', 'path'):
+            data = node.xmln.attrib.get('points' if name != 'path' else 'd', '')
+            if name != 'path' or self.absolute.fullmatch(data):
+                points = Vertices.parse(data).points
+            else:
+                points = Curve.from_path(svgpath.parse_path(data)).points
+            if not len(points): return self.nothing
+            return (*points.min(axis=0), *points.max(axis=0))
+        if name == 'text':
+            if any(element.tag.rpartition('}')[2] == 'textPath' or
+                   {'dx', 'dy', 'rotate', 'textLength'} & set(element.attrib)
+                   for element in node.xmln.iter()): return None
+            characters = len(''.join(node.xmln.itertext()))
+            if not characters: return self.nothing
+            xs, ys, sizes = [], [], []
+            for element in node.xmln.iter():
+                inner = node if element is node.xmln else Node(element)
+                for key, positions in (('x', xs), ('y', ys)):
+                    value = inner.properties.get(key, ())
+                    positions.extend(map(self.length, value if isinstance(value, tuple) else (value,)))
+                sizes.append(self.length(self.inherited(chain + [inner], 'font-size', 16)))
+            if None in xs + ys + sizes: return None
+            size = max(sizes) * 1.5
+            xs, ys = xs or [0], ys or [0]
+            return (min(xs) - characters*size, min(ys) - size,
+                    max(xs) + characters*size, max(ys) + size)
+        return None
+
+    def outline(self, node: Node, chain: List[Node]) -> Optional[Tuple[float]]:
+        """Box of an element and its subtree in its parent's user space."""
+        properties, chain = node.properties, chain + [node]
+        if {'marker', 'marker-start', 'marker-mid', 'marker-end'} & set(properties): return None
+        if node.name in ('g', 'a', 'switch'):
+            boxes = []
+            for child in node.xmln:
+                namespace, _, name = child.tag.rpartition('}')
+                if namespace != '{http://www.w3.org/2000/svg' or name in self.hidden: continue
+                if (box := self.outline(Node(child), chain)) is None: return None
+                boxes.append(box)
+            box = self.union(boxes)
+        else:
+            if (box := self.geometry(node, chain)) is None: return None
+            stroke = self.inherited(chain, 'stroke')
+            if box[0] <= box[2] and stroke is not None and stroke != SorryWhat('none'):
+                width = self.length(self.inherited(chain, 'stroke-width', 1))
+                miter = self.inherited(chain, 'stroke-miterlimit', 4)
+                if width is None or not isinstance(miter, (int, float)): return None
+                pad = width/2 * max(miter, sqrt(2))
+                box = box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad
+        if 'filter' in properties and box[0] <= box[2]:
+            if (box := self.region(properties['filter'], box)) is None: return None
+        if 'transform' in properties:
+            if (matrix := self.affine(properties['transform'])) is None: return None
+            box = self.transform(matrix, box)
+        return box
+
+    def region(self, link, box: Tuple[float]) -> Optional[Tuple[float]]:
+        """Filter region of an element whose fill box is box."""
+        if not isinstance(link, Link) or (element := self.ids.get(link.to)) is None: return None
+        properties = Node(element).properties
+        x, y, w, h = (properties.get(key, Dimension(default, '%')) for key, default in
+                      (('x', -10), ('y', -10), ('width', 120), ('height', 120)))
+        if str(properties.get('filterUnits', '')) == 'userSpaceOnUse':
+            x, y, w, h = map(self.length, (x, y, w, h))
+            if None in (x, y, w, h): return None
+            return x, y, x + w, y + h
+        fractions = [value.value/100 if isinstance(value, Dimension) and value.unit == '%'
+                     else value for value in (x, y, w, h)]
+        if not all(isinstance(value, (int, float)) for value in fractions): return None
+        x, y, w, h = fractions
+        bw, bh = box[2] - box[0], box[3] - box[1]
+        return (box[0] + x*bw, box[1] + y*bh, box[0] + (x + w)*bw, box[1] + (y + h)*bh)
+
+    def box(self, root: ET.Element, path: Tuple[int]) -> Optional[Tuple[int, int, int, int]]:
+        """Pixels a unit can touch, None if that cannot be told."""
+        matrix, chain, element = self.viewport, [Node(root)], root
+        for k in path[:-1]:
+            element = element[k]
+            chain.append(Node(element))
+            if 'transform' in chain[-1].properties:
+                if (transform := self.affine(chain[-1].properties['transform'])) is None:
+                    return None
+                matrix = matrix @ transform
+        if (box := self.outline(Node(element[path[-1]]), chain)) is None: return None
+        if box[0] > box[2]: return 0, 0, 0, 0
+        x0, y0, x1, y1 = self.transform(matrix, box)
+        return (max(0, floor(x0) - 1), max(0, floor(y0) - 1),
+                min(self.image.width, ceil(x1) + 1), min(self.image.height, ceil(y1) + 1))
+
+    def mapping(self, root: ET.Element) -> Optional[np.ndarray]:
+        """Matrix from root user space to the pixels of a full rasterization."""
+        if root.attrib.get('preserveAspectRatio', 'xMidYMid meet').split() not in (
+                ['xMidYMid'], ['xMidYMid', 'meet']): return None
+        if 'viewBox' not in root.attrib: return np.diag([self.scale, self.scale, 1])
+        vx, vy, vw, vh = map(float, Vertices.number.findall(root.attrib['viewBox']))
+        scale = min(self.image.width / vw, self.image.height / vh)
+        return np.array([[scale, 0, (self.image.width - vw*scale)/2 - vx*scale],
+                         [0, scale, (self.image.height - vh*scale)/2 - vy*scale],
+                         [0, 0, 1]])
+
+    def patch(self, root: ET.Element, x0: int, y0: int, x1: int, y1: int) -> pyvips.Image:
+        saved = {key: root.attrib.get(key) for key in
+                 ('width', 'height', 'viewBox', 'preserveAspectRatio')}
+        inverse = np.linalg.inv(self.viewport)
+        (ux0, ux1), (uy0, uy1) = (inverse @ [[x0, x1], [y0, y1], [1, 1]])[:2].tolist()
+        root.attrib.update(width=str(x1 - x0), height=str(y1 - y0),
+                           viewBox=f'{ux0!r} {uy0!r} {ux1 - ux0!r} {uy1 - uy0!r}',
+                           preserveAspectRatio='none')
+        image = rasterize(ET.ElementTree(root), metrics=self.metrics)
+        for key, value in saved.items():
+            if value is None: del root.attrib[key]
+            else: root.attrib[key] = value
+        return image
+
+    def start(self, root: ET.Element, image: pyvips.Image) -> pyvips.Image:
+        self.image = image
+        self.viewport, self.fixed = self.mapping(root), None
+        if self.viewport is not None:
+            self.fixed = [self.box(root, path) for path in self.filtered]
+        if self.fixed is None or None in self.fixed: self.viewport = None
+        else: self.boxes = [self.box(root, path) for path in self.moving]
+        return self.image
+
+    def skip(self, tree: ET.ElementTree, image: pyvips.Image):
+        """Take image as the rendering of tree, as if it had been drawn."""
+        root = tree.getroot()
+        self.ids = {element.attrib['id']: element for element in root.iter()
+                    if 'id' in element.attrib}
+        self.start(root, image.copy_memory())
+
+    def __call__(self, tree: ET.ElementTree) -> pyvips.Image:
+        root = tree.getroot()
+        self.ids = {element.attrib['id']: element for element in root.iter()
+                    if 'id' in element.attrib}
+        if self.image is None: return self.start(root, rasterize(tree, self.scale, self.metrics).copy_memory())
+        boxes = None if self.viewport is None else [self.box(root, path) for path in self.moving]
+        if boxes is None or None in boxes or None in self.boxes:
+            self.image, self.boxes = rasterize(tree, self.scale, self.metrics).copy_memory(), boxes or [None]
+            return self.image
+        x0, y0, x1, y1 = self.union(box for box in self.boxes + boxes if box[0] < box[2]
+                                    and box[1] < box[3])
+        self.boxes = boxes
+        if x0 >= x1 or y0 >= y1: return self.image
+        grown = True
+        while grown:
+            grown = False
+            for box in self.fixed:
+                if box[0] < x1 and x0 < box[2] and box[1] < y1 and y0 < box[3] and (
+                        box[0] < x0 or box[1] < y0 or box[2] > x1 or box[3] > y1):
+                    x0, y0, x1, y1 = self.union([(x0, y0, x1, y1), box])
+                    grown = True
+        patch = self.patch(root, x0, y0, x1, y1)
+        self.image = self.image.insert(patch, x0, y0).copy_memory()
+        return self.image
+
+class FrameCache:
+    """PNG frames on disk, addressed by a digest of the SVG they come from.
+
+    A frame whose serialized tree and render settings were seen before is
+    hard-linked (or copied) from the cache instead of being rasterized.
+    Once the directory outgrows limit bytes, the least recently used
+    entries are evicted.
+    """
+
+    trimming = threading.Lock()
+    counting = threading.Lock()  # hits, misses and size, updated by every drawing thread
+
+    def __init__(self, directory: str, limit: int = 1 << 30, settings: str = ''):
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.limit, self.settings = directory, limit, settings
+        self.hits = self.misses = 0
+        self.size = sum(size for _, size, _ in self.entries())
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """Time of last use, size and path of every entry."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.png') or entry.name.count('.') != 1: continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def key(self, tree: ET.ElementTree) -> str:
+        digest = hashlib.sha256(self.settings.encode())
+        digest.update(ET.tostring(tree.getroot()))
+        return digest.hexdigest()
+
+    def lookup(self, tree: ET.ElementTree) -> Tuple[str, Optional[pyvips.Image]]:
+        """Cache entry of a frame, and its image if it is there already.
+
+        The image is read into memory, so that it survives other processes
+        evicting the entry before it is stored.
+        """
+        entry = os.path.join(self.directory, self.key(tree) + '.png')
+        try:
+            with open(entry, 'rb') as file: png = file.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            with self.counting: self.misses += 1
+            return entry, None
+        with self.counting: self.hits += 1
+        return entry, pyvips.Image.new_from_buffer(png, '')
+
+    def store(self, entry: str, image: pyvips.Image, output: Optional[str]):
+        """Put image under entry, unless it is there already, and link it to output."""
+        if not os.path.exists(entry):
+            # skipped by trim(), unique to the thread writing it
+            temporary = f'{entry[:-4]}.{os.getpid()}-{threading.get_ident()}.png'
+            image.write_to_file(temporary)
+            size = os.path.getsize(temporary)
+            os.replace(temporary, entry)
+            with self.counting: self.size += size
+        if output is not None:
+            if os.path.lexists(output): os.remove(output)
+            try:
+                os.link(entry, output)
+            except FileNotFoundError:  # evicted by another process meanwhile
+                image.write_to_file(output)
+            except OSError:  # no hard links here
+                try:
+                    shutil.copyfile(entry, output)
+                except FileNotFoundError:
+                    image.write_to_file(output)
+        if self.size > self.limit: self.trim()
+
+    def trim(self):
+        with self.trimming:
+            self.evict()
+
+    def evict(self):
+        # other processes sharing the directory evict concurrently
+        entries = self.entries()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.size <= self.limit: break
+            self.size -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def report(self):
+        rate = self.hits / max(1, self.hits + self.misses)
+        print(f'frame cache: {self.hits} hits, {self.misses} misses ({rate:.0%})',
+              file=sys.stderr)
+
+class Manifest:
+    """Frames already rendered by a job, so that it can be resumed.
+
+    Every process appends one JSON line per finished frame to a file of its
+    own under directory, holding the size and digest of the output and the
+    digest of the job. An output counts as done when a line of the same
+    job still matches the file on disk.
+    """
+
+    def __init__(self, directory: str, job: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.job = directory, job
+        self.done: Dict[str, dict] = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.jsonl'): continue
+            with open(os.path.join(directory, name)) as lines:
+                for line in lines:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # cut short by a crash
+                    if record.get('job') == job: self.done[record['output']] = record
+
+    @staticmethod
+    def digest(path: str) -> str:
+        with open(path, 'rb') as data:
+            return hashlib.sha256(data.read()).hexdigest()
+
+    def valid(self, output: str) -> bool:
+        record = self.done.get(output)
+        return (record is not None and os.path.exists(output) and
+                os.path.getsize(output) == record['size'] and
+                self.digest(output) == record['sha256'])
+
+    def add(self, output: str):
+        record = {'output': output, 'size': os.path.getsize(output),
+                  'sha256': self.digest(output), 'job': self.job}
+        name = f'{socket.gethostname()}-{os.getpid()}.jsonl'
+        with open(os.path.join(self.directory, name), 'a') as lines:
+            lines.write(json.dumps(record) + '\n')
+        self.done[output] = record
+
+def job(source: str, target: str, count: int, settings: str) -> str:
+    """Digest of everything a frame of an animation depends on."""
+    digest = hashlib.sha256(f'{count} {settings}'.encode())
+    for path in (source, target):
+        with open(path, 'rb') as document:
+            digest.update(hashlib.sha256(document.read()).digest())
+    return digest.hexdigest()
+
+def shard(indices: List[int], k: int, n: int) -> List[int]:
+    """The k-th of n contiguous, nearly equal parts of indices."""
+    indices = list(indices)
+    return indices[k*len(indices)//n:(k+1)*len(indices)//n]
+
+class Sink(ABC):
+    """Where rendered frames go.
+
+    Frames are put with their index in the animation. Sinks that are
+    ordered need them in the order they were mixed in; sinks that store
+    every frame in a file of its own name it, so that the frame cache can
+    link it and resumed renders can check it.
+    """
+
+    ordered = False
+
+    def path(self, index: int) -> Optional[str]: return None
+
+    @abstractmethod
+    def put(self, index: int, image: pyvips.Image): pass
+
+    def close(self): pass
+
+    @staticmethod
+    def rgba(image: pyvips.Image) -> pyvips.Image:
+        if image.bands == 3: image = image.bandjoin(255)
+        return image.cast('uchar')
+
+class PNGDirectory(Sink):
+    def __init__(self, directory: str = 'out'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def path(self, index: int) -> str: return f'{self.directory}/{index:03}.png'
+
+    def put(self, index: int, image: pyvips.Image):
+        # never write through a hard link into a frame cache
+        if os.path.lexists(path := self.path(index)): os.remove(path)
+        image.write_to_file(path)
+
+class RawStream(Sink):
+    """Frames as consecutive 8-bit RGBA pixels, for an external encoder."""
+
+    ordered = True
+
+    def __init__(self, path: str = '-'):
+        self.stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+
+    def put(self, index: int, image: pyvips.Image):
+        self.stream.write(self.rgba(image).write_to_memory())
+
+    def close(self):
+        self.stream.flush()
+        if self.stream is not sys.stdout.buffer: self.stream.close()
+
+    def __getstate__(self): raise TypeError('a raw stream cannot be shared between processes')
+
+class FrameBuffer(Sink):
+    """Frames in a memory-mapped .npy file of shape (count, height, width, 4).
+
+    The file is sized once, up front, so that several processes can fill
+    their frames in place and readers can np.load it with mmap_mode='r'.
+    """
+
+    def __init__(self, path: str, count: int, width: int, height: int):
+        self.file, self.shape = path, (count, height, width, 4)
+        buffer = None
+        if os.path.exists(path):
+            buffer = np.load(path, mmap_mode='r+')
+            if buffer.shape != self.shape or buffer.dtype != np.uint8: buffer = None
+        if buffer is None:
+            buffer = np.lib.format.open_memmap(path, 'w+', np.uint8, self.shape)
+        buffer.flush()
+        self.buffer = None
+
+    def put(self, index: int, image: pyvips.Image):
+        if self.buffer is None: self.buffer = np.load(self.file, mmap_mode='r+')
+        pixels = np.frombuffer(self.rgba(image).write_to_memory(), dtype=np.uint8)
+        self.buffer[index] = pixels.reshape(self.shape[1:])
+
+    def close(self):
+        if self.buffer is not None: self.buffer.flush()
+
+    def __getstate__(self): return dict(self.__dict__, buffer=None)
+
+class AnimatedImage(Sink):
+    """Frames as the pages of one animated WebP or GIF, chosen by suffix.
+
+    Frames are spooled as raw RGBA to a temporary file beside the output,
+    width*height*4 bytes each, and loaded from it once as a single
+    multi-page image for the encoder when the sink is closed. quality is
+    the WebP Q factor; GIF frames are palettized instead.
+    """
+
+    ordered = True
+
+    def __init__(self, path: str, delay: int = 40, loop: int = 0, quality: int = 75):
+        if not path.lower().endswith(('.webp', '.gif')):
+            raise ValueError(f'{path}: animated output needs a .webp or .gif name')
+        self.file, self.delay, self.loop, self.quality = path, delay, loop, quality
+        self.spool, self.size, self.count = None, None, 0
+
+    def put(self, index: int, image: pyvips.Image):
+        if self.spool is None:
+            self.spool = tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(os.path.abspath(self.file)), suffix='.rgba', delete=False)
+            self.size = image.width, image.height
+        self.spool.write(self.rgba(image).write_to_memory())
+        self.count += 1
+
+    def close(self):
+        if self.spool is None: return
+        self.spool.close()
+        try:
+            width, height = self.size
+            image = pyvips.Image.rawload(self.spool.name, width, height*self.count, 4)
+            image = image.copy(interpretation='srgb')
+            image.set_type(pyvips.GValue.gint_type, 'page-height', height)
+            image.set_type(pyvips.GValue.array_int_type, 'delay', [self.delay]*self.count)
+            image.set_type(pyvips.GValue.gint_type, 'loop', self.loop)
+            options = {'Q': self.quality} if self.file.lower().endswith('.webp') else {}
+            image.write_to_file(self.file, **options)
+        finally:
+            os.remove(self.spool.name)
+            self.spool, self.count = None, 0
+
+    def __getstate__(self): raise TypeError('an animated image is written by one process')
+
+class Metrics:
+    """Wall and CPU time spent in every stage of a render, with counts.
+
+    Stages nest: the time of an inner stage (serializing while rasterizing,
+    mixing one element type while mixing a frame) is only counted there,
+    so the stages add up to the whole run. CPU time is the process's, so
+    stages overlapping under --pipeline share it. Every measurement is also
+    passed to the hooks as (stage, wall, cpu, frame, element) with the time
+    nested stages included, in the process and thread that took it.
+    """
+
+    def __init__(self, hooks: List[Callable] = ()):
+        self.hooks = list(hooks)
+        self.stages: Dict[str, List[float]] = {}  # calls, wall and CPU seconds
+        self.counts: Dict[str, int] = {}
+        self.frames: Dict[int, float] = {}
+        self.elements: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def __getstate__(self):
+        state = dict(self.__dict__, hooks=[])
+        del state['lock'], state['local']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state, lock=threading.Lock(), local=threading.local())
+
+    @contextmanager
+    def timed(self, stage: str, frame: Optional[int] = None, element: Optional[str] = None):
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append([0, 0])  # time of the stages nested in this one
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            inner = stack.pop()
+            if stack: stack[-1][0], stack[-1][1] = stack[-1][0] + wall, stack[-1][1] + cpu
+            with self.lock:
+                totals = self.stages.setdefault(stage, [0, 0, 0])
+                totals[0] += 1
+                totals[1] += wall - inner[0]
+                totals[2] += cpu - inner[1]
+                if frame is not None: self.frames[frame] = self.frames.get(frame, 0) + wall
+                if element is not None:
+                    self.elements[element] = self.elements.get(element, 0) + wall
+            for hook in self.hooks: hook(stage, wall, cpu, frame, element)
+
+    def count(self, name: str, number: int = 1):
+        with self.lock: self.counts[name] = self.counts.get(name, 0) + number
+
+    def merge(self, other: Metrics):
+        with self.lock:
+            for stage, totals in other.stages.items():
+                self.stages[stage] = [a + b for a, b in zip(self.stages.get(stage, [0, 0, 0]),
+                                                            totals)]
+            for mine, theirs in ((self.counts, other.counts), (self.frames, other.frames),
+                                 (self.elements, other.elements)):
+                for key, value in theirs.items(): mine[key] = mine.get(key, 0) + value
+
+    @staticmethod
+    def peak_rss() -> Optional[int]:
+        """Largest resident set of this process or of a finished worker, in bytes."""
+        try:
+            import resource
+        except ImportError:  # Windows
+            return None
+        peak = max(resource.getrusage(who).ru_maxrss
+                   for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def summary(self, slowest: int = 10) -> dict:
+        top = lambda times: dict(sorted(times.items(), key=lambda item: -item[1])[:slowest])
+        return {'stages': {stage: {'calls': calls, 'wall': wall, 'cpu': cpu}
+                           for stage, (calls, wall, cpu) in sorted(self.stages.items())},
+                'counts': dict(sorted(self.counts.items())), 'peak_rss': self.peak_rss(),
+                'slowest_frames': top(self.frames), 'slowest_elements': top(self.elements)}
+
+    def prometheus(self, slowest: int = 10) -> str:
+        """The summary in the text format of the Prometheus node exporter."""
+        label = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+        summary = self.summary(slowest)
+        lines = ['# HELP svglayer_stage_seconds_total Time spent in a stage, without nested stages.',
+                 '# TYPE svglayer_stage_seconds_total counter']
+        for stage, totals in summary['stages'].items():
+            for clock in ('wall', 'cpu'):
+                lines.append(f'svglayer_stage_seconds_total{{stage="{label(stage)}",'
+                             f'clock="{clock}"}} {totals[clock]}')
+        lines += ['# HELP svglayer_stage_calls_total Times a stage ran.',
+                  '# TYPE svglayer_stage_calls_total counter']
+        lines += [f'svglayer_stage_calls_total{{stage="{label(stage)}"}} {totals["calls"]}'
+                  for stage, totals in summary['stages'].items()]
+        lines += ['# HELP svglayer_items_total Frames, elements mixed and resources created.',
+                  '# TYPE svglayer_items_total counter']
+        lines += [f'svglayer_items_total{{item="{label(name)}"}} {number}'
+                  for name, number in summary['counts'].items()]
+        if summary['peak_rss'] is not None:
+            lines += ['# HELP svglayer_peak_rss_bytes Largest resident set of the render.',
+                      '# TYPE svglayer_peak_rss_bytes gauge',
+                      f'svglayer_peak_rss_bytes {summary["peak_rss"]}']
+        for name in ('frame', 'element'):
+            lines += [f'# HELP svglayer_{name}_seconds Time spent on the slowest {name}s.',
+                      f'# TYPE svglayer_{name}_seconds gauge']
+            lines += [f'svglayer_{name}_seconds{{{name}="{label(key)}"}} {seconds}'
+                      for key, seconds in summary[f'slowest_{name}s'].items()]
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path: str):
+        """Write the summary as JSON, or for Prometheus if path ends in .prom."""
+        text = self.prometheus() if path.endswith('.prom') else json.dumps(self.summary(), indent=1)
+        # collectors may read the file at any time: never let them see half of it
+        with open(f'{path}.tmp', 'w') as file: file.write(text)
+        os.replace(f'{path}.tmp', path)
+
+def timed(metrics: Optional[Metrics], stage: str, frame: Optional[int] = None):
+    return nullcontext() if metrics is None else metrics.timed(stage, frame)
+
+@dataclass
+class Settings:
+    """How frames are rendered and where they go, besides which ones."""
+    svgs: Optional[str] = None
+    static: bool = False
+    damage: bool = False
+    scale: float = 1
+    threads: int = 0
+    cache: Optional[FrameCache] = None
+    manifest: Optional[Manifest] = None
+    sink: Optional[Sink] = None
+    metrics: Optional[Metrics] = None
+
+    def key(self) -> str:
+        """Everything besides the frame itself that decides its pixels."""
+        mode = 'damage' if self.damage else 'layers' if self.static else 'full'
+        version = '.'.join(str(pyvips.version(k)) for k in range(3))
+        return f'{mode} scale {self.scale!r} vips {version}'
+
+def pipeline(source: Iterator[tuple], stages: List[Tuple[Callable, int]], depth: int = 2):
+    """Feed the items of source through stages, all running concurrently.
+
+    Every stage is a function and a number of threads calling it, taking
+    the items the previous stage returned. Stages are joined by queues of
+    depth items, so a slow stage holds back those before it. The first
+    error stops the work and is raised once every thread is done.
+    """
+    done, errors, lock = object(), [], threading.Lock()
+    queues = [Queue(depth) for _ in stages] + [None]
+    left = [threads for _, threads in stages]
+
+    def work(k: int):
+        function, inbox, outbox = stages[k][0], queues[k], queues[k+1]
+        while (item := inbox.get()) is not done:
+            if errors: continue  # keep draining so that nobody blocks
+            try:
+                result = function(*item)
+            except BaseException as error:
+                errors.append(error)
+                continue
+            if outbox is not None: outbox.put(result)
+        with lock:
+            left[k] -= 1
+            last = not left[k]
+        if not last: inbox.put(done)
+        elif outbox is not None: outbox.put(done)
+
+    workers = [threading.Thread(target=work, args=(k,), daemon=True)
+               for k, (_, threads) in enumerate(stages) for _ in range(threads)]
+    for worker in workers: worker.start()
+    try:
+        for item in source:
+            if errors: break
+            queues[0].put(item)
+    finally:
+        queues[0].put(done)
+        for worker in workers: worker.join()
+    if errors: raise errors[0]
+
+def render(animation: Animation, indices: List[int], count: int,
+           settings: Optional[Settings] = None):
+    """Render frames into the sink of settings (PNGs in out/ by default)
+    and close it.
+
+    With settings.threads, mixing, rasterizing and writing overlap, and
+    that many threads run each of the pyvips stages. With settings.metrics,
+    every stage of every frame is timed into it.
+    """
+    settings = settings or Settings()
+    sink = settings.sink or PNGDirectory()
+    cache, manifest, threads = settings.cache, settings.manifest, settings.threads
+    metrics = animation.metrics = settings.metrics
+    if manifest is not None:
+        indices = [i for i in indices if (output := sink.path(i)) is None
+                   or not manifest.valid(output)]
+    if settings.svgs is not None: os.makedirs(settings.svgs, exist_ok=True)
+    if settings.damage: draw = Damage(animation, settings.scale)
+    elif settings.static: draw = Layers(animation, settings.scale)
+    else: draw = lambda tree: rasterize(tree, settings.scale, metrics)
+
+    def mixed() -> Iterator[Tuple[int, ET.ElementTree]]:
+        frames = animation.frames([i/(count-1) for i in indices])
+        for i in indices:
+            with timed(metrics, 'mix', i):
+                tree = next(frames)
+            if settings.svgs is not None:
+                with timed(metrics, 'svg', i):
+                    tree.write(f'{settings.svgs}/{i:03}.svg')
+            yield i, tree
+
+    def drawn(i: int, tree: ET.ElementTree) -> Tuple[int, Optional[str], pyvips.Image]:
+        entry = None
+        if cache is not None:
+            with timed(metrics, 'cache', i):
+                entry, image = cache.lookup(tree)
+                if image is not None and hasattr(draw, 'skip'): draw.skip(tree, image)
+            if image is not None: return i, entry, image
+        with timed(metrics, 'raster', i):
+            image = draw(tree)
+            # pyvips is lazy: render here rather than while encoding
+            if threads or metrics is not None: image = image.copy_memory()
+        return i, entry, image
+
+    def written(i: int, entry: Optional[str], image: pyvips.Image):
+        output = sink.path(i)
+        with timed(metrics, 'encode', i):
+            if entry is not None:
+                with timed(metrics, 'cache'):
+                    cache.store(entry, image, output)
+                if output is None: sink.put(i, image)
+            else:
+                sink.put(i, image)
+        if manifest is not None and output is not None: manifest.add(output)
+        if metrics is not None: metrics.count('frames')
+
+    try:
+        if not threads:
+            for frame in mixed(): written(*drawn(*frame))
+            return
+        # the damage rasterizer wants frames one at a time
+        ordered = settings.damage or sink.ordered
+        pipeline(mixed(), [(drawn, 1 if ordered else threads),
+                           (written, 1 if sink.ordered else threads)])
+    finally:
+        with timed(metrics, 'encode'):
+            sink.close()
+
+_animation: Optional[Animation] = None
+_startup: Optional[Metrics] = None
+
+def _start_worker(source: bytes, target: bytes):
+    global _animation, _startup
+    _startup = Metrics()
+    _animation = Animation(BytesIO(source), BytesIO(target), _startup)
+
+def _render_worker(indices: List[int], count: int,
+                   settings: Settings) -> Tuple[int, int, Optional[Metrics]]:
+    global _startup
+    if settings.metrics is not None and _startup is not None:  # once per process
+        settings.metrics.merge(_startup)
+        _startup = None
+    render(_animation, indices, count, settings)
+    cache = settings.cache
+    return (*((cache.hits, cache.misses) if cache is not None else (0, 0)), settings.metrics)
+
+def render_parallel(source, target, count: int, workers: int,
+                    settings: Optional[Settings] = None, indices: Optional[List[int]] = None):
+    settings = settings or Settings()
+    settings = replace(settings, sink=settings.sink or PNGDirectory())
+    sink, cache, manifest = settings.sink, settings.cache, settings.manifest
+    if sink.ordered: raise ValueError(f'{type(sink).__name__} needs frames from one process')
+    indices = range(count) if indices is None else indices
+    if manifest is not None:
+        indices = [i for i in indices if (output := sink.path(i)) is None
+                   or not manifest.valid(output)]
+    with open(source, 'rb') as one, open(target, 'rb') as two:
+        documents = one.read(), two.read()
+    with futures.ProcessPoolExecutor(workers, initializer=_start_worker,
+                                     initargs=documents) as pool:
+        if settings.damage:  # consecutive frames differ the least
+            chunks = [shard(indices, k, workers) for k in range(workers)]
+        else:
+            chunks = [indices[k::workers] for k in range(workers)]
+        # every worker times into a Metrics of its own, merged back here
+        metrics = settings.metrics
+        if metrics is not None: settings = replace(settings, metrics=Metrics())
+        for hits, misses, timings in pool.map(_render_worker, chunks, [count]*workers,
+                                              [settings]*workers):
+            if cache is not None: cache.hits, cache.misses = cache.hits + hits, cache.misses + misses
+            if metrics is not None: metrics.merge(timings)
+
+def render_files(source: str, target: str, count: int = 101, output: str = 'out',
+                 settings: Optional[Settings] = None, workers: int = 1,
+                 indices: Optional[List[int]] = None, every: int = 1,
+                 part: Optional[Tuple[int, int]] = None):
+    """Render count frames morphing the SVG file source into target.
+
+    Frames are written as PNGs to the directory output unless settings
+    names another sink. Of indices (all frames by default) every every-th
+    one is kept and, when part is (k, n), only the k-th of n parts of
+    those, counting from 0.
+    """
+    settings = settings or Settings()
+    settings = replace(settings, sink=settings.sink or PNGDirectory(output))
+    indices = list(range(count) if indices is None else indices)[::every]
+    if part is not None: indices = shard(indices, *part)
+    if workers > 1:
+        render_parallel(source, target, count, workers, settings, indices)
+    else:
+        render(Animation(source, target, settings.metrics), indices, count, settings)
+
+def portion(text: str) -> Tuple[int, int]:
+    """--shard K/N as (k, n), counting parts from 0."""
+    k, _, n = text.partition('/')
+    try:
+        k, n = int(k), int(n)
+    except ValueError:
+        raise ArgumentTypeError(f'{text!r} is not K/N') from None
+    if not 1 <= k <= n: raise ArgumentTypeError(f'{text!r} needs 1 <= K <= N')
+    return k - 1, n
+
+def span(text: str) -> slice:
+    """--frames START:STOP as a slice, with either end left out."""
+    start, _, stop = text.partition(':')
+    try:
+        return slice(int(start) if start else None, int(stop) if stop else None)
+    except ValueError:
+        raise ArgumentTypeError(f'{text!r} is not START:STOP') from None
+
+def main(argv: Optional[List[str]] = None):
+    parser = ArgumentParser(description='Render the frames morphing one SVG into another.')
+    parser.add_argument('source', nargs='?', default='drawingb.svg',
+                        help='first frame (default: drawingb.svg)')
+    parser.add_argument('target', nargs='?', default='drawing.svg',
+                        help='last frame (default: drawing.svg)')
+    parser.add_argument('--count', type=int, default=101,
+                        help='number of frames of the animation')
+    parser.add_argument('--output', default='out', metavar='DIR',
+                        help='directory of the PNG frames (default: out)')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='resolution relative to the size of the documents')
+    parser.add_argument('--preview', type=int, nargs='?', const=4, metavar='K',
+                        help='render every K-th frame at a quarter of --scale (default: 4)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes rendering frames in parallel')
+    parser.add_argument('--keep-svg', dest='svgs', nargs='?', const='', metavar='DIR',
+                        help='also write every frame as SVG (default: DIR/.svg of --output)')
+    parser.add_argument('--static-layers', dest='static', action='store_true',
+                        help='rasterize the parts that never change only once')
+    parser.add_argument('--damage', action='store_true',
+                        help='rasterize only the region that changed since the previous frame')
+    parser.add_argument('--cache', nargs='?', const='.framecache', metavar='DIR',
+                        help='reuse frames rendered before from DIR (default: .framecache)')
+    parser.add_argument('--cache-size', type=int, default=1024, metavar='MB',
+                        help='evict the least recently used cached frames past this size')
+    parser.add_argument('--pipeline', type=int, nargs='?', const=2, default=0,
+                        metavar='THREADS', help='overlap mixing, rasterizing and writing, '
+                        'with THREADS threads for each pyvips stage (default: 2)')
+    parser.add_argument('--shard', type=portion, metavar='K/N',
+                        help='render only the K-th of N contiguous parts of the frames')
+    parser.add_argument('--frames', type=span, metavar='START:STOP',
+                        help='render only the frames from START up to STOP excluded')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the frames a previous run of the same job finished')
+    sinks = parser.add_mutually_exclusive_group()
+    sinks.add_argument('--raw', nargs='?', const='-', metavar='FILE',
+                       help='stream frames as raw 8-bit RGBA to FILE instead of PNGs '
+                       '(default: stdout)')
+    sinks.add_argument('--memmap', metavar='FILE',
+                       help='fill a memory-mapped .npy frame buffer instead of PNGs')
+    sinks.add_argument('--animated', metavar='FILE',
+                       help='write one animated .webp or .gif instead of PNGs; frames are '
+                       'spooled beside FILE first, taking width*height*4 bytes each')
+    parser.add_argument('--delay', type=int, default=40, metavar='MS',
+                        help='time each frame of --animated is shown')
+    parser.add_argument('--loop', type=int, default=0,
+                        help='times --animated plays, 0 for forever')
+    parser.add_argument('--quality', type=int, default=75,
+                        help='WebP quality factor of --animated')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='save the time spent in every stage as JSON, or for the '
+                        'Prometheus textfile collector if FILE ends in .prom')
+    parser.add_argument('--smil', metavar='FILE',
+                        help='write a single animated SVG instead of frames')
+    parser.add_argument('--keyframes', type=int, default=2,
+                        help='keyframes sampled for --smil')
+    parser.add_argument('--duration', type=float, default=4,
+                        help='animation length in seconds for --smil')
+    parser.add_argument('--repeat', action='store_true',
+                        help='loop the --smil animation')
+    args = parser.parse_args(argv)
+    if args.keyframes < 2: parser.error('--keyframes needs at least 2 keyframes')
+    if args.smil:
+        Animation(args.source, args.target).smil(
+            args.keyframes, args.duration, args.repeat).write(args.smil)
+        return
+    if args.count < 2: parser.error('--count needs at least 2 frames')
+    settings = Settings(static=args.static, damage=args.damage, threads=args.pipeline,
+                        scale=args.scale / 4 if args.preview else args.scale,
+                        metrics=Metrics() if args.metrics else None)
+    if args.svgs is not None:
+        settings.svgs = args.svgs or os.path.join(args.output, '.svg')
+    indices = list(range(args.count))
+    if args.frames: indices = indices[args.frames]
+    if (args.raw or args.animated) and args.workers > 1:
+        parser.error('--raw and --animated need frames in order from one process')
+    if args.raw:
+        settings.sink = RawStream(args.raw)
+    elif args.animated:
+        try:
+            settings.sink = AnimatedImage(args.animated, args.delay, args.loop, args.quality)
+        except ValueError as error:
+            parser.error(str(error))
+    elif args.memmap:
+        size = pyvips.Image.new_from_file(args.source, scale=settings.scale)
+        settings.sink = FrameBuffer(args.memmap, args.count, size.width, size.height)
+    if args.resume:
+        settings.manifest = Manifest(os.path.join(args.output, '.manifest'), job(
+            args.source, args.target, args.count, settings.key()))
+    if args.cache:
+        settings.cache = FrameCache(args.cache, args.cache_size << 20, settings.key())
+    render_files(args.source, args.target, args.count, args.output, settings, args.workers,
+                 indices, args.preview or 1, args.shard)
+    if settings.cache is not None: settings.cache.report()
+    if settings.metrics is not None: settings.metrics.save(args.metrics)
+
 ET.register_namespace("", "http://www.w3.org/2000/svg")
-for i in range(101):
-    svg = (tree := ET.parse('drawingb.svg')).getroot()
-    svg2 = ET.parse('drawing.svg').getroot()
-    ids = {node.attrib['id']: Node(node) for node in svg.iter() if 'id' in node.attrib}
-    ids2 = {node.attrib['id']: Node(node) for node in svg2.iter() if 'id' in node.attrib}
-    ids['!defs'] = ids['defs2']
-    ids2['!defs'] = ids2['defs2']
-    for key in ids.keys() & ids2.keys():
-        if (obj := objectify(ids[key], ids)) and isinstance(obj, Drawable):
-            print(key)
-            obj.mix(objectify(ids2[key], ids2), i/100)
-    tree.write(f'out/.svg/{i:03}.svg')
-    pyvips.Image.new_from_file(f'out/.svg/{i:03}.svg').write_to_file(f'out/{i:03}.png')
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import svglayer
+
+def document(body: str, defs: str = '<defs/>') -> str:
+    return ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="100" height="100">{defs}{body}</svg>')
+
+def write(tmp_path, one: str, two: str):
+    (tmp_path / 'a.svg').write_text(one)
+    (tmp_path / 'b.svg').write_text(two)
+    return str(tmp_path / 'a.svg'), str(tmp_path / 'b.svg')
+
+def difference(one: str, two: str) -> float:
+    return (svglayer.pyvips.Image.new_from_file(one) -
+            svglayer.pyvips.Image.new_from_file(two)).abs().max()
+
+def test_damage_with_stroked_moving_element(tmp_path):
+    rect = ('<rect id="a" x="{}" y="10" width="30" height="30" '
+            'style="fill:#00ff00;stroke:#ff0000;stroke-width:2"/>')
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    for damage in (False, True):
+        svglayer.render_files(source, target, 5, str(tmp_path / str(damage)),
+                              svglayer.Settings(damage=damage))
+    for i in range(5):
+        assert difference(str(tmp_path / f'False/{i:03}.png'),
+                          str(tmp_path / f'True/{i:03}.png')) <= 2
+
+def test_closed_path_morphing_into_open_one(tmp_path):
+    path = '<path id="p" d="{}" style="fill:none;stroke:#000000;stroke-width:4"/>'
+    source, target = write(tmp_path, document(path.format('M 10,10 L 90,10 L 50,90 Z')),
+                           document(path.format('M 10,10 L 90,10 L 90,90 L 10,90')))
+    svglayer.render_files(source, target, 3, str(tmp_path / 'out'))
+    svglayer.pyvips.Image.new_from_file(target).write_to_file(str(tmp_path / 'target.png'))
+    assert difference(str(tmp_path / 'out/002.png'), str(tmp_path / 'target.png')) <= 2
+
+def test_gradient_defaults_against_explicit_numbers(tmp_path):
+    rect = '<rect id="r" x="0" y="0" width="100" height="100" style="fill:url(#g)"/>'
+    for units in ('objectBoundingBox', 'userSpaceOnUse'):
+        for kind, given in (('linear', 'x2="0.5"'), ('radial', 'cx="0.2" cy="30" r="0.4"')):
+            gradient = (f'<defs><{kind}Gradient id="g" gradientUnits="{units}" {{}}>'
+                        '<stop offset="0" stop-color="#ff0000"/>'
+                        f'<stop offset="1" stop-color="#0000ff"/></{kind}Gradient></defs>')
+            output = tmp_path / f'{units}-{kind}'
+            output.mkdir()
+            source, target = write(output, document(rect, gradient.format('')),
+                                   document(rect, gradient.format(given)))
+            svglayer.render_files(source, target, 3, str(output))
+            for path, frame in ((source, '000'), (target, '002')):
+                end = str(output / f'{frame}.end.png')
+                svglayer.pyvips.Image.new_from_file(path).write_to_file(end)
+                assert difference(str(output / f'{frame}.png'), end) <= 2
+
+def test_smil_needs_two_keyframes(tmp_path):
+    rect = '<rect id="r" x="{}" y="0" width="10" height="10"/>'
+    animation = svglayer.Animation(*write(tmp_path, document(rect.format(0)),
+                                          document(rect.format(50))))
+    with pytest.raises(ValueError):
+        animation.smil(keyframes=1)
+
+def test_documents_without_defs(tmp_path):
+    rect = '<rect id="r" x="{}" y="10" width="30" height="30" style="{}"/>'
+    source, target = write(tmp_path, document(rect.format(10, 'fill:#ff0000'), defs=''),
+                           document(rect.format(50, 'fill:#ff0000;filter:url(#f)'),
+                                    defs='<defs><filter id="f"><feGaussianBlur stdDeviation="3"/>'
+                                         '</filter></defs>'))
+    svglayer.render_files(source, target, 3, str(tmp_path / 'out'))
+    assert len(os.listdir(tmp_path / 'out')) == 3
+
+def test_frame_cache_entries_evicted_by_another_process(tmp_path, monkeypatch):
+    rect = '<rect id="r" x="{}" y="10" width="30" height="30" style="fill:#ff0000"/>'
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    cache = svglayer.FrameCache(str(tmp_path / 'cache'))
+    svglayer.render_files(source, target, 3, str(tmp_path / 'first'), svglayer.Settings(cache=cache))
+    animation = svglayer.Animation(source, target)
+    entry, image = cache.lookup(animation.frame(0))
+    assert image is not None
+    os.remove(entry)
+    cache.store(entry, image, str(tmp_path / 'output.png'))
+    assert difference(str(tmp_path / 'output.png'), str(tmp_path / 'first/000.png')) == 0
+    entries = cache.entries()
+    os.remove(entries[0][2])
+    monkeypatch.setattr(cache, 'entries', lambda: entries)
+    cache.limit = 0
+    cache.evict()
+
+def test_animated_image_spools_frames(tmp_path):
+    rect = '<rect id="a" x="{}" y="10" width="30" height="30" style="fill:#00ff00"/>'
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    svglayer.render_files(source, target, 4, str(tmp_path / 'out'))
+    output = str(tmp_path / 'out.gif')
+    svglayer.render_files(source, target, 4, str(tmp_path / 'out'),
+                          svglayer.Settings(sink=svglayer.AnimatedImage(output, delay=20)))
+    assert sorted(os.listdir(tmp_path)) == ['a.svg', 'b.svg', 'out', 'out.gif']
+    image = svglayer.pyvips.Image.new_from_file(output, n=-1)
+    assert image.get('n-pages') == 4 and image.get('delay') == [20]*4
+    for i in range(4):
+        page = svglayer.pyvips.Image.new_from_file(output, page=i).flatten(background=255)
+        frame = svglayer.pyvips.Image.new_from_file(str(tmp_path / f'out/{i:03}.png'))
+        assert (page - frame.flatten(background=255)).abs().avg() <= 1
+
+def test_static_layers_with_use_of_another_run(tmp_path):
+    body = ('<circle id="c" cx="20" cy="20" r="15" style="fill:#0000ff"/>'
+            '<rect id="r" x="{}" y="50" width="20" height="20" style="fill:#ff0000"/>'
+            '<use id="u" xlink:href="#c" x="50" y="0"/>')
+    source, target = write(tmp_path, document(body.format(10)), document(body.format(70)))
+    for static in (False, True):
+        svglayer.render_files(source, target, 3, str(tmp_path / str(static)),
+                              svglayer.Settings(static=static))
+    for i in range(3):
+        assert difference(str(tmp_path / f'False/{i:03}.png'),
+                          str(tmp_path / f'True/{i:03}.png')) <= 2
+
+def test_static_channels_are_written_once(tmp_path):
+    body = ('<path id="p" d="M 10,10 L 90,10 L 50,90 Z" style="fill:#0000ff"/>'
+            '<rect id="r" x="{}" y="50" width="20" height="20" style="fill:#ff0000"/>')
+    source, target = write(tmp_path, document(body.format(10)), document(body.format(70)))
+    animation = svglayer.Animation(source, target)
+    assert {channel.key for channel in animation.channels} == {'r'}
+    assert animation.animated() == {'r'}
+    svglayer.render_files(source, target, 3, str(tmp_path / 'out'))
+    svglayer.pyvips.Image.new_from_file(target).write_to_file(str(tmp_path / 'target.png'))
+    assert difference(str(tmp_path / 'out/002.png'), str(tmp_path / 'target.png')) <= 2
+
+def test_polyline_growing_from_nothing(tmp_path):
+    line = '<polyline id="l" points="{}" style="fill:none;stroke:#000000;stroke-width:4"/>'
+    source, target = write(tmp_path, document(line.format('')),
+                           document(line.format('10,10 90,10 50,90')))
+    svglayer.render_files(source, target, 3, str(tmp_path / 'out'))
+    svglayer.pyvips.Image.new_from_file(target).write_to_file(str(tmp_path / 'target.png'))
+    assert difference(str(tmp_path / 'out/002.png'), str(tmp_path / 'target.png')) <= 2
+    svglayer.render_files(target, source, 3, str(tmp_path / 'back'))
+    assert difference(str(tmp_path / 'back/000.png'), str(tmp_path / 'target.png')) <= 2
+
+def test_shards_cover_every_frame_once():
+    for count in range(12):
+        for n in range(1, 5):
+            parts = [svglayer.shard(range(count), k, n) for k in range(n)]
+            assert [i for part in parts for i in part] == list(range(count))
+            assert max(map(len, parts)) - min(map(len, parts)) <= 1
+
+def test_manifest_checks_outputs(tmp_path):
+    output = tmp_path / 'frame.png'
+    output.write_bytes(b'frame')
+    manifest = svglayer.Manifest(str(tmp_path / 'manifest'), 'job')
+    assert not manifest.valid(str(output))
+    manifest.add(str(output))
+    assert svglayer.Manifest(str(tmp_path / 'manifest'), 'job').valid(str(output))
+    assert not svglayer.Manifest(str(tmp_path / 'manifest'), 'other').valid(str(output))
+    output.write_bytes(b'fraME')
+    assert not svglayer.Manifest(str(tmp_path / 'manifest'), 'job').valid(str(output))
+
+@pytest.mark.parametrize('option', [['--shard', 'x/2'], ['--shard', '2'], ['--shard', '3/2'],
+                                    ['--frames', 'a:b']])
+def test_bad_frame_selections(tmp_path, option):
+    with pytest.raises(SystemExit):
+        svglayer.main([*write(tmp_path, document(''), document('')), *option])
+
+def test_resume_renders_only_missing_frames(tmp_path):
+    rect = '<rect id="a" x="{}" y="10" width="30" height="30" style="fill:#00ff00"/>'
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    out = str(tmp_path / 'out')
+    svglayer.main([source, target, '--count', '6', '--output', out, '--shard', '1/2', '--resume'])
+    assert sorted(os.listdir(out)) == ['.manifest', '000.png', '001.png', '002.png']
+    stats = {name: os.stat(os.path.join(out, name)) for name in ('000.png', '001.png', '002.png')}
+    os.remove(os.path.join(out, '001.png'))
+    del stats['001.png']
+    svglayer.main([source, target, '--count', '6', '--output', out, '--resume'])
+    assert sorted(os.listdir(out)) == ['.manifest', *(f'{i:03}.png' for i in range(6))]
+    for name, stat in stats.items():
+        now = os.stat(os.path.join(out, name))
+        assert (now.st_ino, now.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+    svglayer.render_files(source, target, 6, str(tmp_path / 'whole'))
+    for i in range(6):
+        assert difference(os.path.join(out, f'{i:03}.png'),
+                          str(tmp_path / f'whole/{i:03}.png')) == 0
+
+def patched(a, b, runs):
+    """a with the runs of changes(a, b) replaced by their text in b."""
+    result, i = [], 0
+    for i1, i2, j1, j2 in runs:
+        assert i <= i1 <= i2 and a[i:i1] == b[j1 - (i1 - i):j1]
+        result += list(a[i:i1]) + list(b[j1:j2])
+        i = i2
+    return result + list(a[i:])
+
+def test_edit_scripts_go_from_one_string_to_the_other():
+    rng = random.Random(0)
+    for _ in range(3000):
+        a, b = (''.join(rng.choice('ab c\n.') for _ in range(rng.randrange(30)))
+                for _ in range(2))
+        script = svglayer.EditScript(a, b)
+        assert script(0) == a and script(1) == b
+        assert patched(a, b, svglayer.changes(a, b)) == list(b)
+        assert all(i1 <= i2 and j1 <= j2 and (i1, j1) != (i2, j2)
+                   for (i1, j1), (i2, j2) in zip(script.marks, script.marks[1:]))
+
+def test_edit_scripts_of_long_reordered_texts():
+    rng = random.Random(1)
+    words = [rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet']) + str(rng.randrange(50))
+             for _ in range(5000)]
+    shuffled = words[:]
+    rng.shuffle(shuffled)
+    for a, b in ((' '.join(words), ' '.join(shuffled)),
+                 (' '.join(words), ' '.join(words[2500:] + words[:2500]))):
+        script = svglayer.EditScript(a, b)
+        assert script(0) == a and script(1) == b and script(0.5) != a
+    # no anchors and too big for SequenceMatcher: one replaced run
+    assert svglayer.changes('ab'*600, 'ba'*600, limit=1000) == [(0, 1200, 0, 1200)]
+
+def test_frame_cache_with_drawing_threads(tmp_path):
+    rect = '<rect id="a" x="{}" y="10" width="30" height="30" style="fill:#00ff00"/>'
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    svglayer.render_files(source, target, 8, str(tmp_path / 'whole'))
+    cache = svglayer.FrameCache(str(tmp_path / 'cache'))
+    for run in ('first', 'second'):
+        svglayer.render_files(source, target, 8, str(tmp_path / run),
+                              svglayer.Settings(cache=cache, threads=4))
+        for i in range(8):
+            assert difference(str(tmp_path / f'{run}/{i:03}.png'),
+                              str(tmp_path / f'whole/{i:03}.png')) == 0
+    assert (cache.hits, cache.misses) == (8, 8)
+
+def test_raw_and_memmap_sinks_hold_the_png_frames(tmp_path):
+    rect = '<rect id="a" x="{}" y="10" width="30" height="30" style="fill:#00ff00;fill-opacity:0.5"/>'
+    source, target = write(tmp_path, document(rect.format(10)), document(rect.format(50)))
+    svglayer.render_files(source, target, 4, str(tmp_path / 'out'))
+    frames = [svglayer.Sink.rgba(svglayer.pyvips.Image.new_from_file(
+        str(tmp_path / f'out/{i:03}.png'))).write_to_memory() for i in range(4)]
+    svglayer.render_files(source, target, 4, str(tmp_path / 'out'), svglayer.Settings(
+        sink=svglayer.RawStream(str(tmp_path / 'frames.rgba'))))
+    assert (tmp_path / 'frames.rgba').read_bytes() == b''.join(frames)
+    svglayer.render_files(source, target, 4, str(tmp_path / 'out'), svglayer.Settings(
+        sink=svglayer.FrameBuffer(str(tmp_path / 'frames.npy'), 4, 100, 100)))
+    buffer = np.load(str(tmp_path / 'frames.npy'), mmap_mode='r')
+    assert [frame.tobytes() for frame in buffer] == frames
+    with pytest.raises(TypeError):
+        svglayer.Sink()